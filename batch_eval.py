@@ -0,0 +1,61 @@
+"""Vectorized evaluation of many positions at once, for offline work (EPD suites, labels, audits).
+
+Needs NumPy, which the engine itself does not. Scores are exactly those of
+chess_engine.evaluate_board.
+
+Usage: python batch_eval.py positions.epd     prints "score  fen" per line
+"""
+import sys
+
+import numpy as np
+
+import chess_engine
+import utils as u
+
+#the engine's tables flattened to [(piece + 6) * 64 + square] so one np.take gathers a whole batch
+piece_square_array_mg = np.array(chess_engine.piece_square_tables_mg, dtype=np.int32).ravel()
+piece_square_array_eg = np.array(chess_engine.piece_square_tables_eg, dtype=np.int32).ravel()
+phase_weight_array = np.repeat(np.array(chess_engine.phase_weights, dtype=np.int32), 64)
+#added to piece * 64 to get the flat table index of each square
+square_offsets = np.arange(64, dtype=np.intp) + 6 * 64
+
+#rows scored per step, bounds the (rows, 64) int64 temporaries to a few MB
+batch_chunk_size = 16384
+
+
+def boards_from_fens(fens):
+    """(N, 64) int8 array of the board_array encoding for each FEN or EPD line."""
+    boards = np.zeros((len(fens), 64), dtype=np.int8)
+    for row, fen in enumerate(fens):
+        boards[row] = u.fen_to_board_state(fen)[0]
+    return boards
+
+
+def evaluate_batch(boards):
+    """Scores an (N, 64) array of board_array-encoded positions; returns an (N,) int64 array."""
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim != 2 or boards.shape[1] != 64:
+        raise ValueError(f"Expected an (N, 64) array of boards, got shape {boards.shape}")
+
+    max_phase = chess_engine.max_phase
+    scores = np.empty(len(boards), dtype=np.int64)
+    for start in range(0, len(boards), batch_chunk_size):
+        table_indices = boards[start:start + batch_chunk_size].astype(np.intp)
+        table_indices *= 64
+        table_indices += square_offsets
+        score_mg = piece_square_array_mg.take(table_indices).sum(axis=1, dtype=np.int64)
+        score_eg = piece_square_array_eg.take(table_indices).sum(axis=1, dtype=np.int64)
+        phase = np.minimum(phase_weight_array.take(table_indices).sum(axis=1, dtype=np.int64), max_phase)
+        #same floor division as chess_engine.tapered_score
+        scores[start:start + batch_chunk_size] = (score_mg * phase + score_eg * (max_phase - phase)) // max_phase
+    return scores
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python batch_eval.py positions.epd")
+        sys.exit(1)
+    with open(sys.argv[1]) as epd_file:
+        fens = [line.strip() for line in epd_file if line.strip()]
+    for score, fen in zip(evaluate_batch(boards_from_fens(fens)), fens):
+        print(f"{score:8d}  {fen}")
@@ -0,0 +1,471 @@
+"""Microbenchmarks for the engine's hot paths, run on a fixed set of positions.
+
+Usage: python bench.py sliders [--iterations N]
+       python bench.py eval [--iterations N]
+       python bench.py batch [--positions N]      (needs NumPy)
+       python bench.py ordering [--depth N]
+       python bench.py tactics [--depth N]
+       python bench.py smp [--depth N] [--threads 1,2,4,8]
+       python bench.py split [--depth N] [--workers 0,2,4,8]
+"""
+import argparse
+import os
+import sys
+import time
+
+import chess_engine
+import move_gen as mg
+import utils as u
+
+bench_fens = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+]
+
+#(fen, best move) pairs from the Win At Chess suite, best moves in UCI notation
+tactics_suite = [
+    ("2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1", "g3g6"),
+    ("8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - 0 1", "b3b2"),
+    ("5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - 0 1", "e3g3"),
+    ("r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PPR/2KR4 w - - 0 1", "h6h7"),
+    ("5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - 0 1", "c6c4"),
+    ("7k/p7/1R5K/6r1/6p1/6P1/8/8 w - - 0 1", "b6b7"),
+    ("rnbqkb1r/pppp1ppp/8/4P3/6n1/7P/PPPNPPP1/R1BQKBNR b KQkq - 0 1", "g4e3"),
+    ("r4q1k/p2bR1rp/2p2Q1N/5p2/5p2/2P5/PP3PPP/R5K1 w - - 0 1", "e7f7"),
+    ("3q1rk1/p4pp1/2pb3p/3p4/6Pr/1PNQ4/P1PB1PP1/4RRK1 b - - 0 1", "d6h2"),
+    ("2br2k1/2q3rn/p2NppQ1/2p1P3/Pp5R/4P3/1P3PPP/3R2K1 w - - 0 1", "h4h7"),
+]
+
+
+def load_bench_positions():
+    return [u.fen_to_board_state(fen) for fen in bench_fens]
+
+
+def load_bench_position_objects():
+    """The bench positions plus every position one legal move after them."""
+    positions = []
+    for fen in bench_fens:
+        position = chess_engine.position_from_fen(fen)
+        positions.append(position.copy())
+        for move in chess_engine.get_legal_moves(position):
+            chess_engine.make_move(position, move)
+            positions.append(position.copy())
+            chess_engine.unmake_move(position)
+    return positions
+
+
+def time_call(fn, iterations):
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start_time
+
+
+def report(label, elapsed, calls):
+    print(f"  {label:<40} {elapsed:8.3f}s  {calls / elapsed:12,.0f} calls/s")
+
+
+#Step-walk slider generators as they were before the ray tables, kept as the baseline
+#(moves in the same int encoding the generators now use)
+def _step_slider_moves(board, from_index, directions):
+    possible_moves = []
+    is_white = board[from_index] > 0
+    start_rank, start_file = divmod(from_index, 8)
+    for dr, df in directions:
+        current_rank, current_file = start_rank + dr, start_file + df
+        while mg.is_valid_square(current_rank, current_file):
+            current_index = current_rank * 8 + current_file
+            target_piece = board[current_index]
+            if target_piece == 0:
+                possible_moves.append(from_index | (current_index << 6))
+            else:
+                if (target_piece > 0 and not is_white) or (target_piece < 0 and is_white):
+                    possible_moves.append(from_index | (current_index << 6))
+                break
+            current_rank += dr
+            current_file += df
+    return possible_moves
+
+
+def _step_slider_attacker(board, square_index, attacking_color_is_white):
+    target_rank, target_file = divmod(square_index, 8)
+    opponent_color_sign = 1 if attacking_color_is_white else -1
+    for dr, df in mg.rook_directions + mg.bishop_diagonal_directions:
+        current_rank, current_file = target_rank + dr, target_file + df
+        while mg.is_valid_square(current_rank, current_file):
+            piece = board[current_rank * 8 + current_file]
+            if piece != 0:
+                if piece * opponent_color_sign > 0:
+                    piece_type = abs(piece)
+                    if piece_type == 5: return True
+                    if piece_type == 4 and (dr == 0 or df == 0): return True
+                    if piece_type == 3 and abs(dr) == abs(df): return True
+                break
+            current_rank += dr
+            current_file += df
+    return False
+
+
+def _ray_slider_attacker(board, square_index, attacking_color_is_white):
+    sign = 1 if attacking_color_is_white else -1
+    for rays, piece_a, piece_b in ((mg.rook_rays, 4 * sign, 5 * sign), (mg.bishop_rays, 3 * sign, 5 * sign)):
+        for ray in rays[square_index]:
+            for check_index in ray:
+                piece = board[check_index]
+                if piece != 0:
+                    if piece == piece_a or piece == piece_b:
+                        return True
+                    break
+    return False
+
+
+def bench_sliders(iterations):
+    positions = load_bench_positions()
+    boards = [position[0] for position in positions]
+    sliders = [(board, index, abs(board[index])) for board in boards
+               for index in range(64) if abs(board[index]) in (3, 4, 5)]
+    occupancies = [(index, mg.board_to_bitboards(board)) for board, index, _ in sliders]
+    occupancies = [(index, bbs[mg.white_occupancy_slot] | bbs[mg.black_occupancy_slot])
+                   for index, bbs in occupancies]
+    direction_sets = {3: mg.bishop_diagonal_directions, 4: mg.rook_directions,
+                      5: mg.rook_directions + mg.bishop_diagonal_directions}
+    table_generators = {3: mg.generate_bishop_moves, 4: mg.generate_rook_moves, 5: mg.generate_queen_moves}
+
+    for board, index, piece_type in sliders:
+        assert sorted(_step_slider_moves(board, index, direction_sets[piece_type])) == \
+               sorted(table_generators[piece_type](board, index))
+    for board in boards:
+        for square_index in range(64):
+            for color in (True, False):
+                assert _step_slider_attacker(board, square_index, color) == \
+                       _ray_slider_attacker(board, square_index, color)
+    for index, occupied in occupancies:
+        assert mg.sliding_attacks_bb(index, occupied, mg.rook_shift_directions) == mg.rook_attacks_bb(index, occupied)
+        assert mg.sliding_attacks_bb(index, occupied, mg.bishop_shift_directions) == mg.bishop_attacks_bb(index, occupied)
+
+    print(f"Sliding pieces: {len(sliders)} sliders on {len(boards)} positions, {iterations} iterations")
+    calls = len(sliders) * iterations
+    step = time_call(lambda: [_step_slider_moves(b, i, direction_sets[t]) for b, i, t in sliders], iterations)
+    rays = time_call(lambda: [table_generators[t](b, i) for b, i, t in sliders], iterations)
+    report("moves, step walk (before)", step, calls)
+    report("moves, ray tables", rays, calls)
+    print(f"  speedup {step / rays:.2f}x")
+
+    calls = len(boards) * 128 * iterations
+    step = time_call(lambda: [_step_slider_attacker(b, s, c) for b in boards for s in range(64) for c in (True, False)], iterations)
+    rays = time_call(lambda: [_ray_slider_attacker(b, s, c) for b in boards for s in range(64) for c in (True, False)], iterations)
+    report("slider attack probe, step walk (before)", step, calls)
+    report("slider attack probe, ray tables", rays, calls)
+    print(f"  speedup {step / rays:.2f}x")
+
+    calls = len(occupancies) * 2 * iterations
+    fill = time_call(lambda: [(mg.sliding_attacks_bb(i, o, mg.rook_shift_directions),
+                               mg.sliding_attacks_bb(i, o, mg.bishop_shift_directions)) for i, o in occupancies], iterations)
+    lookup = time_call(lambda: [(mg.rook_attacks_bb(i, o), mg.bishop_attacks_bb(i, o)) for i, o in occupancies], iterations)
+    report("bitboard attacks, shift fill (before)", fill, calls)
+    report("bitboard attacks, occupancy lookup", lookup, calls)
+    print(f"  speedup {fill / lookup:.2f}x")
+
+
+#evaluate_board as it was before the flattened tables, kept as the baseline; it uses the
+#old endgame switch instead of the tapered score, so only its speed is comparable
+def _evaluate_board_rebuilt_tables(position):
+    piece_values = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 20000}
+
+    knight_pst_values = [
+    [-167, -89, -34, -49,  61, -97, -15, -107],
+    [ -73, -41,  72,  36,  23,  62,   7,  -17],
+    [-80, -18,  51,  33,  56,  31,  -4,  -53],
+    [-55, -25,  12,  24,  24,  12,  -25, -55],
+    [-55, -25,  12,  24,  24,  12,  -25, -55],
+    [-80, -18,  51,  33,  56,  31,  -4,  -53],
+    [ -73, -41,  72,  36,  23,  62,   7,  -17],
+    [-167, -89, -34, -49,  61, -97, -15, -107]]
+    pawn_pst_values = [
+    [   0,   0,   0,   0,   0,   0,   0,   0],
+    [  78,  83,  44,  10,  26,  53, -32,   1],
+    [  56,  51,  24,  -5,  -6,  13,  -4, -11],
+    [  52,  35,   1, -10, -19,   0,  10,  -8],
+    [  46,  21,  -8, -17, -17,  -8,  19,  46],
+    [  48,  22,  -8, -16, -16,  -9,  21,  48],
+    [  43,  17,  -9,  -18, -18, -9,  17,  43],
+    [   0,   0,   0,   0,   0,   0,   0,   0]]
+    bishop_pst_values = [
+    [ -29,  -8, -25, -38, -27, -44,  12,  -9],
+    [ -43, -14, -42, -29, -11, -22,  -9, -32],
+    [ -25, -12, -20, -16, -17,  18,  -4,  -14],
+    [ -13,  -3, -14, -15, -14, -5,  -1,  -13],
+    [ -13,  -3, -14, -15, -14, -5,  -1,  -13],
+    [ -25, -12, -20, -16, -17,  18,  -4,  -14],
+    [ -43, -14, -42, -29, -11, -22,  -9, -32],
+    [ -29,  -8, -25, -38, -27, -44,  12,  -9]
+    ]
+    rook_pst_values = [
+    [  35,  29,  33,   4,  37,  33,  56,  50],
+    [  55,  29,  56,  55,  55,  62,  56,  55],
+    [  -2,   4,  16,  51,  47,  12,  26,  28],
+    [  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
+    [  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
+    [  -2,   4,  16,  51,  47,  12,  26,  28],
+    [  55,  29,  56,  55,  55,  62,  56,  55],
+    [  35,  29,  33,   4,  37,  33,  56,  50]
+    ]
+    queen_pst_values = [
+    [  -9,  22,  22,  27,  27,  22,  22,  -9],
+    [ -16, -16, -16,  -7,  -7, -16, -16, -16],
+    [ -16, -16, -17,  13,  14, -17, -16, -16],
+    [  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
+    [  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
+    [ -16, -16, -17,  13,  14, -17, -16, -16],
+    [ -16, -16, -16,  -7,  -7, -16, -16, -16],
+    [  -9,  22,  22,  27,  27,  22,  22,  -9]
+    ]
+    king_pst_values_mg = [#Midgame king PST
+    [ -65, -23, -15, -15, -15, -15, -23, -65],
+    [ -44, -15, -13, -12, -12, -13, -15, -44],
+    [ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
+    [ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
+    [ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
+    [ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
+    [ -44, -15, -13, -12, -12, -13, -15, -44],
+    [ -65, -23, -15, -15, -15, -15, -23, -65]
+    ]
+    king_pst_values_eg = [#Endgame king PST
+    [-50, -30, -10, -10, -10, -10, -30, -50],
+    [-30, -10,  10,  20,  20,  10, -10, -30],
+    [-10,  10,  20,  30,  30,  20,  10, -10],
+    [-10,  10,  30,  40,  40,  30,  10, -10],
+    [-10,  10,  30,  40,  40,  30,  10, -10],
+    [-10,  10,  20,  30,  30,  20,  10, -10],
+    [-30, -10,  10,  20,  20,  10, -10, -30],
+    [-50, -30, -10, -10, -10, -10, -30, -50]
+    ]
+
+    board = position.board
+    occupied_squares = position.piece_squares[1] + position.piece_squares[0]
+
+    white_material = 0
+    black_material = 0
+    for index in occupied_squares:
+        piece_val = board[index]
+        p_type = abs(piece_val)
+        val = 0
+        if p_type == 2 or p_type == 3: val = 3 #K/B
+        elif p_type == 4: val = 5 #R
+        elif p_type == 5: val = 9 #Q
+        if piece_val > 0: white_material += val
+        elif piece_val < 0: black_material += val
+
+    is_endgame = (white_material < 13) and (black_material < 13)
+    king_pst_to_use = king_pst_values_eg if is_endgame else king_pst_values_mg
+
+    pst_tables = {
+        1: pawn_pst_values,
+        2: knight_pst_values,
+        3: bishop_pst_values,
+        4: rook_pst_values,
+        5: queen_pst_values,
+        6: king_pst_to_use
+    }
+
+
+    white_score = 0
+    black_score = 0
+    total_material = 0
+
+    for index in occupied_squares:
+        piece = board[index]
+
+        piece_type = abs(piece)
+        piece_color_mult = 1 if piece > 0 else -1
+        rank = index // 8
+        file = index % 8
+
+        material_value = piece_values.get(u.piece_int_to_char(piece).lower(), 0) * 100 
+
+        pst_value = 0
+        if piece_type in pst_tables:
+            pst_table = pst_tables[piece_type]
+            pst_value = pst_table[rank][file] if piece > 0 else pst_table[7-rank][file]
+
+        score = material_value + pst_value
+
+        if piece > 0:
+            white_score += score
+            if piece_type != 1 and piece_type != 6:
+                 total_material += piece_values.get(u.piece_int_to_char(piece).lower(), 0)
+        else:
+            black_score += score
+            if piece_type != 1 and piece_type != 6:
+                 total_material += piece_values.get(u.piece_int_to_char(piece).lower(), 0)
+
+    final_score = white_score - black_score
+
+    return final_score
+
+
+def bench_eval(iterations):
+    positions = load_bench_position_objects()
+    for position in positions:
+        assert chess_engine.evaluate_board(position) == chess_engine.evaluate_position(position)
+
+    print(f"Evaluation: {len(positions)} positions, {iterations} iterations")
+    calls = len(positions) * iterations
+    rebuilt = time_call(lambda: [_evaluate_board_rebuilt_tables(p) for p in positions], iterations)
+    flat = time_call(lambda: [chess_engine.evaluate_board(p) for p in positions], iterations)
+    incremental = time_call(lambda: [chess_engine.evaluate_position(p) for p in positions], iterations)
+    report("evaluate_board, tables per call (before)", rebuilt, calls)
+    report("evaluate_board, flat tables", flat, calls)
+    report("evaluate_position, incremental", incremental, calls)
+    print(f"  speedup {rebuilt / flat:.2f}x flat, {rebuilt / incremental:.2f}x incremental")
+
+
+def bench_batch(position_count):
+    import numpy as np
+    import batch_eval
+
+    boards = []
+    for position in load_bench_position_objects():
+        for move in chess_engine.get_legal_moves(position):
+            chess_engine.make_move(position, move)
+            boards.append(list(position.board))
+            chess_engine.unmake_move(position)
+    board_array = np.array(boards, dtype=np.int8)
+    assert list(batch_eval.evaluate_batch(board_array)) == \
+           [chess_engine.evaluate_board(chess_engine.Position(board)) for board in boards]
+
+    print(f"Batch evaluation: {len(boards)} distinct positions checked, timing {position_count}")
+    tiled = np.resize(board_array, (position_count, 64))
+    start_time = time.perf_counter()
+    batch_eval.evaluate_batch(tiled)
+    batched = time.perf_counter() - start_time
+    sample = [chess_engine.Position(board) for board in boards]
+    single = time_call(lambda: [chess_engine.evaluate_board(p) for p in sample], 1)
+    report("evaluate_board, one at a time", single, len(sample))
+    report("evaluate_batch", batched, position_count)
+    print(f"  {position_count / batched * 60:,.0f} positions/minute, "
+          f"speedup {(single / len(sample)) / (batched / position_count):.1f}x")
+
+
+def bench_ordering(depth):
+    print(f"Move ordering: fixed-depth {depth} search of each bench position, fresh hash table")
+    total_nodes = total_cutoffs = total_first = 0
+    total_time = 0.0
+    for fen in bench_fens:
+        chess_engine.transposition_table.clear()
+        position = chess_engine.position_from_fen(fen)
+        start_time = time.perf_counter()
+        best_move, score, _ = chess_engine.iterative_deepening(position, depth)
+        elapsed = time.perf_counter() - start_time
+        nodes, cutoffs, first = chess_engine.nodes_visited, chess_engine.beta_cutoffs, chess_engine.first_move_cutoffs
+        total_nodes += nodes
+        total_cutoffs += cutoffs
+        total_first += first
+        total_time += elapsed
+        print(f"  {fen[:40]:<40} {nodes:>9} nodes  {elapsed:7.2f}s  first-move cutoffs {first / max(cutoffs, 1):6.1%}")
+    print(f"  {'total':<40} {total_nodes:>9} nodes  {total_time:7.2f}s  first-move cutoffs {total_first / max(total_cutoffs, 1):6.1%}")
+
+
+def bench_tactics(depth):
+    print(f"Tactics: fixed-depth {depth} search of {len(tactics_suite)} positions")
+    solved = total_nodes = 0
+    total_time = 0.0
+    for fen, expected_move in tactics_suite:
+        chess_engine.transposition_table.clear()
+        position = chess_engine.position_from_fen(fen)
+        start_time = time.perf_counter()
+        best_move, score, _ = chess_engine.iterative_deepening(position, depth)
+        elapsed = time.perf_counter() - start_time
+        found_move = mg.move_to_uci_string(best_move) if best_move is not None else "none"
+        solved += found_move == expected_move
+        total_nodes += chess_engine.nodes_visited
+        total_time += elapsed
+        print(f"  {fen[:40]:<40} {expected_move}  found {found_move}  {chess_engine.nodes_visited:>9} nodes  {elapsed:7.2f}s"
+              f"  {'ok' if found_move == expected_move else 'MISSED'}")
+    print(f"  solved {solved}/{len(tactics_suite)}, {total_nodes} nodes, {total_time:.2f}s")
+
+
+def bench_smp(depth, thread_counts):
+    import lazy_smp
+    print(f"Lazy SMP: time to depth {depth} over the bench positions, fresh hash table, {os.cpu_count()} CPUs")
+    base_time = None
+    for threads in thread_counts:
+        lazy_smp.set_worker_count(threads - 1)
+        total_time = 0.0
+        total_nodes = 0
+        for fen in bench_fens:
+            chess_engine.transposition_table.clear()
+            position = chess_engine.position_from_fen(fen)
+            iteration_nodes = [0]
+            start_time = time.perf_counter()
+            lazy_smp.parallel_search(position, depth,
+                                     on_iteration=lambda depth, move, score, nodes, elapsed: iteration_nodes.append(nodes))
+            total_time += time.perf_counter() - start_time
+            total_nodes += iteration_nodes[-1]
+        base_time = base_time or total_time
+        print(f"  {threads:>2} threads  {total_time:7.2f}s  speedup {base_time / total_time:5.2f}x  {total_nodes:>9} nodes")
+        sys.stdout.flush()
+    lazy_smp.stop_workers()
+
+
+def bench_split(depth, worker_counts):
+    import root_split
+    print(f"Root splitting: fixed-depth {depth} search of each bench position, fresh hash table, {os.cpu_count()} CPUs")
+    base_time = None
+    for count in worker_counts:
+        root_split.start_pool(count)
+        total_time = 0.0
+        total_nodes = 0
+        for fen in bench_fens:
+            chess_engine.transposition_table.clear()
+            position = chess_engine.position_from_fen(fen)
+            start_time = time.perf_counter()
+            chess_engine.find_best_move(position, depth)
+            total_time += time.perf_counter() - start_time
+            total_nodes += chess_engine.nodes_visited
+        base_time = base_time or total_time
+        print(f"  {count:>2} workers  {total_time:7.2f}s  speedup {base_time / total_time:5.2f}x  {total_nodes:>9} nodes")
+        sys.stdout.flush()
+    root_split.stop_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Engine microbenchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    sliders_parser = subparsers.add_parser("sliders", help="sliding piece moves and attacks")
+    sliders_parser.add_argument("--iterations", type=int, default=500)
+    eval_parser = subparsers.add_parser("eval", help="static evaluation")
+    eval_parser.add_argument("--iterations", type=int, default=200)
+    batch_parser = subparsers.add_parser("batch", help="NumPy batched evaluation")
+    batch_parser.add_argument("--positions", type=int, default=1000000)
+    ordering_parser = subparsers.add_parser("ordering", help="search node counts and first-move cutoff rate")
+    ordering_parser.add_argument("--depth", type=int, default=4)
+    tactics_parser = subparsers.add_parser("tactics", help="tactical test positions")
+    tactics_parser.add_argument("--depth", type=int, default=4)
+    smp_parser = subparsers.add_parser("smp", help="Lazy SMP time-to-depth scaling")
+    smp_parser.add_argument("--depth", type=int, default=5)
+    smp_parser.add_argument("--threads", default="1,2,4,8", help="comma-separated process counts")
+    split_parser = subparsers.add_parser("split", help="root-move splitting over a process pool")
+    split_parser.add_argument("--depth", type=int, default=5)
+    split_parser.add_argument("--workers", default="0,2,4,8", help="comma-separated pool sizes, 0 for no pool")
+    args = parser.parse_args()
+
+    if args.benchmark == "sliders":
+        bench_sliders(args.iterations)
+    elif args.benchmark == "eval":
+        bench_eval(args.iterations)
+    elif args.benchmark == "batch":
+        bench_batch(args.positions)
+    elif args.benchmark == "ordering":
+        bench_ordering(args.depth)
+    elif args.benchmark == "tactics":
+        bench_tactics(args.depth)
+    elif args.benchmark == "smp":
+        bench_smp(args.depth, [int(threads) for threads in args.threads.split(",")])
+    elif args.benchmark == "split":
+        bench_split(args.depth, [int(workers) for workers in args.workers.split(",")])
+    sys.stdout.flush()
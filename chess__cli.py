@@ -1,11 +1,12 @@
 import time
 import chess_engine
+from move_gen import move_to_tuple
 from chess_engine import (
     find_best_move,
     make_move,
     get_legal_moves,
     is_king_in_check,
-    reset_game_state,
+    starting_position,
 
 )
 import utils as u
@@ -57,24 +58,17 @@ def format_move_algebraic(move_tuple):
 
 def run_game(white_depth=DEFAULT_SEARCH_DEPTH, black_depth=DEFAULT_SEARCH_DEPTH, verbose=True):
     try:
-        chess_engine.reset_game_state()
+        position = starting_position()
     except Exception as e:
-        print(f"Error during chess_engine.reset_game_state: {e}")
+        print(f"Error during chess_engine.starting_position: {e}")
         return "Error"
 
-    if not hasattr(chess_engine, 'board_array') or chess_engine.board_array is None:
-        print("Error: chess_engine.board_array not initialized after reset.")
-        return "Error"
-    if not isinstance(chess_engine.board_array, list) or len(chess_engine.board_array) != 64:
-         print(f"Error: chess_engine.board_array has invalid format after reset: {type(chess_engine.board_array)}, len={len(chess_engine.board_array) if isinstance(chess_engine.board_array, list) else 'N/A'}")
-         return "Error"
-
-    board_array = list(chess_engine.board_array)
-    current_castling_rights = chess_engine.castling_rights
-    current_en_passant_target = chess_engine.en_passant_target
-    is_white_turn = (chess_engine.side_to_move == 'w')
+    board_array = position.board
+    is_white_turn = position.is_white_turn
 
     move_history = []
+    #how often each position (by Zobrist key) has occurred, for threefold repetition
+    position_counts = {position.zobrist_key: 1}
     full_move_number = 0 
 
     if verbose: print("Starting new game...")
@@ -89,12 +83,12 @@ def run_game(white_depth=DEFAULT_SEARCH_DEPTH, black_depth=DEFAULT_SEARCH_DEPTH,
             print_board_ascii(board_array)
             turn_color = "White" if is_white_turn else "Black"
             print(f"\nMove {full_move_number}, {turn_color}'s turn")
-            ep_sq = u.index_1d_to_square(current_en_passant_target) if current_en_passant_target is not None else '-'
-            print(f"State: CR='{current_castling_rights}', EP={ep_sq}")
+            ep_sq = u.index_1d_to_square(position.en_passant_target) if position.en_passant_target is not None else '-'
+            print(f"State: CR='{position.castling_rights}', EP={ep_sq}, Key={position.zobrist_key:016x}")
 
-        legal_moves = get_legal_moves(board_array, is_white_turn, current_castling_rights, current_en_passant_target)
+        legal_moves = get_legal_moves(position)
         if not legal_moves:
-            king_in_check = is_king_in_check(board_array, is_white_turn)
+            king_in_check = is_king_in_check(position, is_white_turn)
             if king_in_check:
                 result = '0-1' if is_white_turn else '1-0' 
                 winner = "Black" if is_white_turn else "White"
@@ -108,13 +102,7 @@ def run_game(white_depth=DEFAULT_SEARCH_DEPTH, black_depth=DEFAULT_SEARCH_DEPTH,
         depth = white_depth if is_white_turn else black_depth
         start_time = time.time()
         try:
-            best_move, engine_eval = find_best_move(
-                board_array,
-                depth=depth,
-                is_maximizing_player=is_white_turn,
-                current_castling_rights=current_castling_rights, 
-                current_en_passant_target=current_en_passant_target 
-            )
+            best_move, engine_eval = find_best_move(position, depth=depth)
         except Exception as e:
             print(f"\n--- ERROR during find_best_move ---")
             import traceback; traceback.print_exc()
@@ -126,32 +114,32 @@ def run_game(white_depth=DEFAULT_SEARCH_DEPTH, black_depth=DEFAULT_SEARCH_DEPTH,
             print("ERROR: Engine returned None move unexpectedly. Check engine logic. Declaring draw.")
             return '1/2-1/2'
 
-        move_str = format_move_algebraic(best_move)
+        move_str = format_move_algebraic(move_to_tuple(best_move))
         if verbose:
             print(f"Engine ({'White' if is_white_turn else 'Black'}) chose: {move_str} (Eval: {engine_eval:.2f}, Time: {end_time - start_time:.2f}s)")
 
         try:
 
-            _captured, next_cr, next_ep = make_move(
-                board_array,
-                best_move,
-                current_castling_rights,
-                current_en_passant_target
-            )
-            current_castling_rights = next_cr
-            current_en_passant_target = next_ep
+            make_move(position, best_move)
 
         except Exception as e:
              print(f"\n--- ERROR during make_move in CLI ---")
              print(f"Move: {best_move}, Board: {board_array[:16]}...")
-             print(f"CR: {current_castling_rights}, EP: {current_en_passant_target}")
+             print(f"CR: {position.castling_rights}, EP: {position.en_passant_target}")
              import traceback; traceback.print_exc()
              print("Aborting game due to make_move error.")
              return "Error"
 
-        is_white_turn = (chess_engine.side_to_move == 'w')
+        is_white_turn = position.is_white_turn
         move_history.append(best_move)
 
+        position_counts[position.zobrist_key] = position_counts.get(position.zobrist_key, 0) + 1
+        if position_counts[position.zobrist_key] >= 3:
+            if verbose:
+                print("\nThreefold repetition! Draw.")
+                print_board_ascii(board_array)
+            return '1/2-1/2'
+
 
         current_player_king_val = 6 if is_white_turn else -6
         current_player_king_present = False
@@ -174,10 +162,10 @@ def run_game(white_depth=DEFAULT_SEARCH_DEPTH, black_depth=DEFAULT_SEARCH_DEPTH,
                  print_board_ascii(board_array) 
             return result
         else:
-            current_player_legal_moves = get_legal_moves(board_array, is_white_turn, current_castling_rights, current_en_passant_target)
+            current_player_legal_moves = get_legal_moves(position)
 
             if not current_player_legal_moves:
-                king_in_check = is_king_in_check(board_array, is_white_turn) 
+                king_in_check = is_king_in_check(position, is_white_turn) 
                 if king_in_check:
                     result = '1-0' if not is_white_turn else '0-1' 
                     winner = "White" if not is_white_turn else "Black"
@@ -2,334 +2,981 @@ from move_gen import (generate_knight_moves, generate_rook_moves,
                       generate_bishop_moves, generate_queen_moves,
                       generate_pawn_moves, generate_king_moves,
                       is_square_attacked,
-                      generate_pseudo_legal_moves 
+                      generate_pseudo_legal_moves,
+                      board_to_bitboards, generate_legal_moves_bb,
+                      legal_move_masks_bb, generate_legal_noisy_moves_bb,
+                      generate_legal_quiet_moves_bb, is_pseudo_legal_move,
+                      move_leaves_king_in_check_bb,
+                      white_occupancy_slot, black_occupancy_slot,
+                      move_flag_en_passant, move_flag_castle_k, move_flag_castle_q,
+                      move_flag_promote_n, move_to_tuple,
+                      static_exchange_eval_bb, see_piece_values
                      )
 import utils as u
-board_array = None
+from transposition import TranspositionTable, bound_exact, bound_lower, bound_upper
 import cProfile
 import pstats
+import random
 import sys
 import time
 import copy 
 
-def reset_game_state():
-    global board_array, side_to_move, castling_rights, en_passant_target, halfmove_clock, fullmove_number
-    board_array = u.get_starting_board_array()
-    side_to_move = 'w'
-    castling_rights = 'KQkq'
-    en_passant_target = None
-    halfmove_clock = 0
-    fullmove_number = 1
-
-def evaluate_board(board):
-    piece_values = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 20000}
-
-    knight_pst_values = [
-    [-167, -89, -34, -49,  61, -97, -15, -107],
-    [ -73, -41,  72,  36,  23,  62,   7,  -17],
-    [-80, -18,  51,  33,  56,  31,  -4,  -53],
-    [-55, -25,  12,  24,  24,  12,  -25, -55],
-    [-55, -25,  12,  24,  24,  12,  -25, -55],
-    [-80, -18,  51,  33,  56,  31,  -4,  -53],
-    [ -73, -41,  72,  36,  23,  62,   7,  -17],
-    [-167, -89, -34, -49,  61, -97, -15, -107]]
-    pawn_pst_values = [
-    [   0,   0,   0,   0,   0,   0,   0,   0],
-    [  78,  83,  44,  10,  26,  53, -32,   1],
-    [  56,  51,  24,  -5,  -6,  13,  -4, -11],
-    [  52,  35,   1, -10, -19,   0,  10,  -8],
-    [  46,  21,  -8, -17, -17,  -8,  19,  46],
-    [  48,  22,  -8, -16, -16,  -9,  21,  48],
-    [  43,  17,  -9,  -18, -18, -9,  17,  43],
-    [   0,   0,   0,   0,   0,   0,   0,   0]]
-    bishop_pst_values = [
-    [ -29,  -8, -25, -38, -27, -44,  12,  -9],
-    [ -43, -14, -42, -29, -11, -22,  -9, -32],
-    [ -25, -12, -20, -16, -17,  18,  -4,  -14],
-    [ -13,  -3, -14, -15, -14, -5,  -1,  -13],
-    [ -13,  -3, -14, -15, -14, -5,  -1,  -13],
-    [ -25, -12, -20, -16, -17,  18,  -4,  -14],
-    [ -43, -14, -42, -29, -11, -22,  -9, -32],
-    [ -29,  -8, -25, -38, -27, -44,  12,  -9]
-    ]
-    rook_pst_values = [
-    [  35,  29,  33,   4,  37,  33,  56,  50],
-    [  55,  29,  56,  55,  55,  62,  56,  55],
-    [  -2,   4,  16,  51,  47,  12,  26,  28],
-    [  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
-    [  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
-    [  -2,   4,  16,  51,  47,  12,  26,  28],
-    [  55,  29,  56,  55,  55,  62,  56,  55],
-    [  35,  29,  33,   4,  37,  33,  56,  50]
-    ]
-    queen_pst_values = [
-    [  -9,  22,  22,  27,  27,  22,  22,  -9],
-    [ -16, -16, -16,  -7,  -7, -16, -16, -16],
-    [ -16, -16, -17,  13,  14, -17, -16, -16],
-    [  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
-    [  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
-    [ -16, -16, -17,  13,  14, -17, -16, -16],
-    [ -16, -16, -16,  -7,  -7, -16, -16, -16],
-    [  -9,  22,  22,  27,  27,  22,  22,  -9]
-    ]
-    king_pst_values_mg = [#Midgame king PST
-    [ -65, -23, -15, -15, -15, -15, -23, -65],
-    [ -44, -15, -13, -12, -12, -13, -15, -44],
-    [ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
-    [ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
-    [ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
-    [ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
-    [ -44, -15, -13, -12, -12, -13, -15, -44],
-    [ -65, -23, -15, -15, -15, -15, -23, -65]
-    ]
-    king_pst_values_eg = [#Endgame king PST
-    [-50, -30, -10, -10, -10, -10, -30, -50],
-    [-30, -10,  10,  20,  20,  10, -10, -30],
-    [-10,  10,  20,  30,  30,  20,  10, -10],
-    [-10,  10,  30,  40,  40,  30,  10, -10],
-    [-10,  10,  30,  40,  40,  30,  10, -10],
-    [-10,  10,  20,  30,  30,  20,  10, -10],
-    [-30, -10,  10,  20,  20,  10, -10, -30],
-    [-50, -30, -10, -10, -10, -10, -30, -50]
-    ]
-
-    white_material = 0
-    black_material = 0
-    for piece_val in board:
-        p_type = abs(piece_val)
-        val = 0
-        if p_type == 2 or p_type == 3: val = 3 #K/B
-        elif p_type == 4: val = 5 #R
-        elif p_type == 5: val = 9 #Q
-        if piece_val > 0: white_material += val
-        elif piece_val < 0: black_material += val
-
-    is_endgame = (white_material < 13) and (black_material < 13)
-    king_pst_to_use = king_pst_values_eg if is_endgame else king_pst_values_mg
-
-    pst_tables = {
-        1: pawn_pst_values,
-        2: knight_pst_values,
-        3: bishop_pst_values,
-        4: rook_pst_values,
-        5: queen_pst_values,
-        6: king_pst_to_use
-    }
-
-
-    white_score = 0
-    black_score = 0
-    total_material = 0
+#castling right lost when a king/rook leaves, or a rook is captured on, the square
+castling_right_by_rook_square = {56: 'Q', 63: 'K', 0: 'q', 7: 'k'}
 
-    for index in range(64):
-        piece = board[index]
-        if piece == 0: continue
-
-        piece_type = abs(piece)
-        piece_color_mult = 1 if piece > 0 else -1
-        rank = index // 8
-        file = index % 8
-
-        material_value = piece_values.get(u.piece_int_to_char(piece).lower(), 0) * 100 
-
-        pst_value = 0
-        if piece_type in pst_tables:
-            pst_table = pst_tables[piece_type]
-            pst_value = pst_table[rank][file] if piece > 0 else pst_table[7-rank][file]
-
-        score = material_value + pst_value
-
-        if piece > 0:
-            white_score += score
-            if piece_type != 1 and piece_type != 6:
-                 total_material += piece_values.get(u.piece_int_to_char(piece).lower(), 0)
-        else:
-            black_score += score
-            if piece_type != 1 and piece_type != 6:
-                 total_material += piece_values.get(u.piece_int_to_char(piece).lower(), 0)
+#Zobrist keys: a position's key is the XOR of the keys of everything in it. The seed is
+#fixed so keys are the same in every run and every process.
+_zobrist_random = random.Random(0x5EED)
+zobrist_piece_keys = [[_zobrist_random.getrandbits(64) if piece != 6 else 0 for _ in range(64)]
+                      for piece in range(13)] #[piece + 6][index]
+zobrist_black_to_move_key = _zobrist_random.getrandbits(64)
+zobrist_castling_keys = {right: _zobrist_random.getrandbits(64) for right in 'KQkq'}
+zobrist_ep_file_keys = [_zobrist_random.getrandbits(64) for _ in range(8)]
 
-    final_score = white_score - black_score
 
-    return final_score
+def castling_zobrist_key(castling_rights):
+    key = 0
+    for right in castling_rights:
+        key ^= zobrist_castling_keys[right]
+    return key
 
 
-def is_king_in_check(board, color_is_white):
-    king_piece_value = 6 if color_is_white else -6
-    king_index = -1
-
+def compute_zobrist_key(board, is_white_turn, castling_rights, en_passant_target):
+    """Zobrist key of a board_array and its game state, computed from scratch."""
+    key = 0
     for index in range(64):
-        if board[index] == king_piece_value:
-            king_index = index
-            break
-
+        if board[index] != 0:
+            key ^= zobrist_piece_keys[board[index] + 6][index]
+    if not is_white_turn:
+        key ^= zobrist_black_to_move_key
+    key ^= castling_zobrist_key(castling_rights)
+    if en_passant_target is not None:
+        key ^= zobrist_ep_file_keys[en_passant_target % 8]
+    return key
+
+
+class Position:
+    """A board together with the game state that belongs to it.
+
+    Besides the 64-entry board, the position keeps each side's piece squares,
+    both king squares, the bitboards used by move_gen and the evaluation terms
+    (middlegame and endgame material+PST scores and the game phase) and the
+    Zobrist key in sync, so nothing has to rescan the board.
+    Lists indexed by color use index 1 for white and 0 for black (i.e. they
+    can be indexed with an is_white bool).
+    make_move/unmake_move are the only functions that should modify it.
+    """
+    __slots__ = ('board', 'is_white_turn', 'castling_rights', 'en_passant_target',
+                 'piece_squares', 'king_squares', 'bitboards', 'undo_stack',
+                 'score_mg', 'score_eg', 'phase', 'zobrist_key')
+
+    def __init__(self, board, is_white_turn=True, castling_rights='KQkq', en_passant_target=None):
+        self.board = list(board)
+        self.is_white_turn = is_white_turn
+        self.castling_rights = castling_rights
+        self.en_passant_target = en_passant_target
+        self.piece_squares = ([], [])
+        self.king_squares = [-1, -1]
+        self.score_mg = 0
+        self.score_eg = 0
+        self.phase = 0
+        for index in range(64):
+            piece = self.board[index]
+            if piece == 0: continue
+            self.piece_squares[piece > 0].append(index)
+            self.score_mg += piece_square_tables_mg[piece + 6][index]
+            self.score_eg += piece_square_tables_eg[piece + 6][index]
+            self.phase += phase_weights[piece + 6]
+            if abs(piece) == 6:
+                self.king_squares[piece > 0] = index
+        self.bitboards = board_to_bitboards(self.board)
+        self.zobrist_key = compute_zobrist_key(self.board, is_white_turn, castling_rights, en_passant_target)
+        self.undo_stack = []
+
+    def copy(self):
+        return Position(self.board, self.is_white_turn, self.castling_rights, self.en_passant_target)
+
+    def side_to_move(self):
+        return 'w' if self.is_white_turn else 'b'
+
+
+def starting_position():
+    return Position(u.get_starting_board_array(), True, 'KQkq', None)
+
+def position_from_fen(fen_string):
+    return Position(*u.fen_to_board_state(fen_string))
+
+#Piece-square tables from white's side, indexed [rank][file] like the board (rank 0 is the 8th rank)
+knight_pst_values = [
+[-167, -89, -34, -49,  61, -97, -15, -107],
+[ -73, -41,  72,  36,  23,  62,   7,  -17],
+[-80, -18,  51,  33,  56,  31,  -4,  -53],
+[-55, -25,  12,  24,  24,  12,  -25, -55],
+[-55, -25,  12,  24,  24,  12,  -25, -55],
+[-80, -18,  51,  33,  56,  31,  -4,  -53],
+[ -73, -41,  72,  36,  23,  62,   7,  -17],
+[-167, -89, -34, -49,  61, -97, -15, -107]]
+pawn_pst_values = [
+[   0,   0,   0,   0,   0,   0,   0,   0],
+[  78,  83,  44,  10,  26,  53, -32,   1],
+[  56,  51,  24,  -5,  -6,  13,  -4, -11],
+[  52,  35,   1, -10, -19,   0,  10,  -8],
+[  46,  21,  -8, -17, -17,  -8,  19,  46],
+[  48,  22,  -8, -16, -16,  -9,  21,  48],
+[  43,  17,  -9,  -18, -18, -9,  17,  43],
+[   0,   0,   0,   0,   0,   0,   0,   0]]
+bishop_pst_values = [
+[ -29,  -8, -25, -38, -27, -44,  12,  -9],
+[ -43, -14, -42, -29, -11, -22,  -9, -32],
+[ -25, -12, -20, -16, -17,  18,  -4,  -14],
+[ -13,  -3, -14, -15, -14, -5,  -1,  -13],
+[ -13,  -3, -14, -15, -14, -5,  -1,  -13],
+[ -25, -12, -20, -16, -17,  18,  -4,  -14],
+[ -43, -14, -42, -29, -11, -22,  -9, -32],
+[ -29,  -8, -25, -38, -27, -44,  12,  -9]
+]
+rook_pst_values = [
+[  35,  29,  33,   4,  37,  33,  56,  50],
+[  55,  29,  56,  55,  55,  62,  56,  55],
+[  -2,   4,  16,  51,  47,  12,  26,  28],
+[  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
+[  -3,  -9,  -2,  12,  14,  -1,  -3,  -4],
+[  -2,   4,  16,  51,  47,  12,  26,  28],
+[  55,  29,  56,  55,  55,  62,  56,  55],
+[  35,  29,  33,   4,  37,  33,  56,  50]
+]
+queen_pst_values = [
+[  -9,  22,  22,  27,  27,  22,  22,  -9],
+[ -16, -16, -16,  -7,  -7, -16, -16, -16],
+[ -16, -16, -17,  13,  14, -17, -16, -16],
+[  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
+[  -3, -14,  -2,  -5,  -5,  -2, -14,  -3],
+[ -16, -16, -17,  13,  14, -17, -16, -16],
+[ -16, -16, -16,  -7,  -7, -16, -16, -16],
+[  -9,  22,  22,  27,  27,  22,  22,  -9]
+]
+king_pst_values_mg = [#Midgame king PST
+[ -65, -23, -15, -15, -15, -15, -23, -65],
+[ -44, -15, -13, -12, -12, -13, -15, -44],
+[ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
+[ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
+[ -15,  -4,   2,  -8,  -8,   2,  -4, -15],
+[ -28,  -8,  -6,  -7,  -7,  -6,  -8, -28],
+[ -44, -15, -13, -12, -12, -13, -15, -44],
+[ -65, -23, -15, -15, -15, -15, -23, -65]
+]
+pawn_pst_values_eg = [#Endgame pawn PST: advanced pawns are worth more
+[   0,   0,   0,   0,   0,   0,   0,   0],
+[  80,  80,  80,  80,  80,  80,  80,  80],
+[  50,  50,  50,  50,  50,  50,  50,  50],
+[  30,  30,  30,  30,  30,  30,  30,  30],
+[  15,  15,  15,  15,  15,  15,  15,  15],
+[   5,   5,   5,   5,   5,   5,   5,   5],
+[   0,   0,   0,   0,   0,   0,   0,   0],
+[   0,   0,   0,   0,   0,   0,   0,   0]
+]
+king_pst_values_eg = [#Endgame king PST
+[-50, -30, -10, -10, -10, -10, -30, -50],
+[-30, -10,  10,  20,  20,  10, -10, -30],
+[-10,  10,  20,  30,  30,  20,  10, -10],
+[-10,  10,  30,  40,  40,  30,  10, -10],
+[-10,  10,  30,  40,  40,  30,  10, -10],
+[-10,  10,  20,  30,  30,  20,  10, -10],
+[-30, -10,  10,  20,  20,  10, -10, -30],
+[-50, -30, -10, -10, -10, -10, -30, -50]
+]
+
+piece_values = {1: 100, 2: 320, 3: 330, 4: 500, 5: 900, 6: 20000}
+#game phase contributed by each piece, indexed by piece + 6; max_phase is the starting
+#position (full middlegame) and 0 is bare kings and pawns (pure endgame)
+phase_weights = [0, 4, 2, 1, 1, 0, 0, 0, 1, 1, 2, 4, 0]
+max_phase = 24
+
+
+def build_piece_square_tables(pst_by_type):
+    """Flattens the tables to tables[piece + 6][index] with the material (x100) folded in.
+
+    Black's tables are mirrored and negated, so the evaluation is just the sum
+    of tables[piece + 6][index] over the occupied squares.
+    """
+    tables = [[0] * 64 for _ in range(13)]
+    for piece_type, pst in pst_by_type.items():
+        material_value = piece_values[piece_type] * 100
+        for index in range(64):
+            rank, file = divmod(index, 8)
+            tables[piece_type + 6][index] = material_value + pst[rank][file]
+            tables[6 - piece_type][index] = -(material_value + pst[7 - rank][file])
+    return tables
+
+
+piece_square_tables_mg = build_piece_square_tables({
+    1: pawn_pst_values, 2: knight_pst_values, 3: bishop_pst_values,
+    4: rook_pst_values, 5: queen_pst_values, 6: king_pst_values_mg})
+piece_square_tables_eg = build_piece_square_tables({
+    1: pawn_pst_values_eg, 2: knight_pst_values, 3: bishop_pst_values,
+    4: rook_pst_values, 5: queen_pst_values, 6: king_pst_values_eg})
+
+
+def tapered_score(score_mg, score_eg, phase):
+    """Blends the middlegame and endgame scores by the game phase."""
+    if phase > max_phase:
+        phase = max_phase #promotions can push the phase past the starting value
+    return (score_mg * phase + score_eg * (max_phase - phase)) // max_phase
+
+
+def evaluate_board(position):
+    """Tapered material plus piece-square score from white's point of view."""
+    board = position.board
+    tables_mg = piece_square_tables_mg
+    tables_eg = piece_square_tables_eg
+    score_mg = 0
+    score_eg = 0
+    phase = 0
+    for index in position.piece_squares[1] + position.piece_squares[0]:
+        piece = board[index] + 6
+        score_mg += tables_mg[piece][index]
+        score_eg += tables_eg[piece][index]
+        phase += phase_weights[piece]
+    return tapered_score(score_mg, score_eg, phase)
+
+
+#when True, evaluate_position checks the incremental score against evaluate_board
+debug_incremental_eval = False
+
+def evaluate_position(position):
+    """Same score as evaluate_board, read from the terms make_move keeps up to date."""
+    score = tapered_score(position.score_mg, position.score_eg, position.phase)
+    if debug_incremental_eval:
+        full_score = evaluate_board(position)
+        assert score == full_score, f"incremental eval {score} != evaluate_board {full_score}"
+    return score
+
+
+def is_king_in_check(position, color_is_white):
+    king_index = position.king_squares[color_is_white]
     if king_index == -1:
         return False
-    return is_square_attacked(board, king_index, not color_is_white)
-
-def get_legal_moves(board, is_white_turn, current_castling_rights, current_en_passant_target):
-    legal_moves = []
-    pseudo_legal_moves = generate_pseudo_legal_moves(board, is_white_turn, current_castling_rights, current_en_passant_target)
-
-    for move in pseudo_legal_moves:
-        temp_board = list(board)
-
-        _, _, _ = make_move(
-            temp_board, move, current_castling_rights, current_en_passant_target
-        )
-        king_in_check_after_move = is_king_in_check(temp_board, is_white_turn)
+    return is_square_attacked(position.board, king_index, not color_is_white)
+
+def get_legal_moves(position):
+    return generate_legal_moves_bb(position.bitboards, position.is_white_turn,
+                                   position.castling_rights, position.en_passant_target)
+
+def is_legal_move(position, move):
+    """Checks that a move taken from outside the generator (hash move, killer) is legal here."""
+    return is_pseudo_legal_move(position.board, move, position.is_white_turn,
+                                position.castling_rights, position.en_passant_target) and \
+           not move_leaves_king_in_check_bb(position.bitboards, move, position.is_white_turn)
+
+def is_quiet_move(position, move):
+    flag = move >> 12
+    return position.board[(move >> 6) & 63] == 0 and (flag == 0 or flag == move_flag_castle_k or flag == move_flag_castle_q)
+
+#mvv_lva_scores[victim_type][attacker_type]: most valuable victim first, then least valuable attacker
+mvv_lva_scores = [[victim * 8 - attacker for attacker in range(7)] for victim in range(7)]
+
+def noisy_move_score(board, move):
+    """MVV-LVA order key of a capture or promotion; a promotion counts like winning the new piece."""
+    to_index, flag = (move >> 6) & 63, move >> 12
+    victim_type = abs(board[to_index]) if flag != move_flag_en_passant else 1
+    score = mvv_lva_scores[victim_type][abs(board[move & 63])] if victim_type else 0
+    if flag >= move_flag_promote_n:
+        score += (flag - 6) * 8
+    return score
+
+def is_losing_capture(position, move):
+    """True if the static exchange evaluation of a capture or promotion is negative.
+
+    Capturing something at least as valuable as the capturing piece can never
+    lose material, so the exchange is only resolved for the other captures.
+    """
+    board = position.board
+    flag = move >> 12
+    if flag < move_flag_promote_n:
+        victim_type = 1 if flag == move_flag_en_passant else abs(board[(move >> 6) & 63])
+        if see_piece_values[victim_type] >= see_piece_values[abs(board[move & 63])]:
+            return False
+    return static_exchange_eval_bb(position.bitboards, board, move) < 0
+
+def staged_moves(position, hash_move=None, killer_moves=(), history=None):
+    """Yields the legal moves of position in stages: hash move, winning and equal
+    noisy moves, killers, quiet moves, losing captures.
+
+    Noisy moves come in MVV-LVA order, and those that lose material by static
+    exchange evaluation wait until the end. Quiet moves come by descending
+    history[move & 4095] when a history table is given. A stage is only
+    generated once the search asks for a move past the previous one, so a
+    cutoff on the hash move or a capture never pays for the quiet moves. The
+    position must be back in the same state each time the search resumes the
+    generator (make/unmake around every yielded move).
+    """
+    bitboards = position.bitboards
+    is_white_turn = position.is_white_turn
+
+    if hash_move is not None and is_legal_move(position, hash_move):
+        yield hash_move
+    else:
+        hash_move = None
+
+    legal_masks = legal_move_masks_bb(bitboards, is_white_turn)
+    noisy_moves = generate_legal_noisy_moves_bb(bitboards, is_white_turn, position.en_passant_target, legal_masks)
+    if len(noisy_moves) > 1:
+        board = position.board
+        noisy_moves.sort(key=lambda move: noisy_move_score(board, move), reverse=True)
+    losing_captures = []
+    for move in noisy_moves:
+        if move != hash_move:
+            if is_losing_capture(position, move):
+                losing_captures.append(move)
+            else:
+                yield move
+
+    played_killers = []
+    for killer in killer_moves:
+        if killer is not None and killer != hash_move and killer not in played_killers \
+           and is_quiet_move(position, killer) and is_legal_move(position, killer):
+            played_killers.append(killer)
+            yield killer
+
+    quiet_moves = generate_legal_quiet_moves_bb(bitboards, is_white_turn, position.castling_rights, legal_masks)
+    if history is not None:
+        quiet_moves.sort(key=lambda move: history[move & 4095], reverse=True)
+    for move in quiet_moves:
+        if move != hash_move and move not in played_killers:
+            yield move
+
+    for move in losing_captures:
+        yield move
+
+#Move ordering memory, shared by the nodes of a search
+max_search_ply = 128
+#killer_moves[ply]: the two latest quiet moves that caused a beta cutoff at that ply
+killer_moves = [[None, None] for _ in range(max_search_ply)]
+#history_scores[is_white][move & 4095]: depth^2 summed over the cutoffs of a quiet from-to move
+history_scores = [[0] * 4096, [0] * 4096]
+
+def _reset_move_ordering():
+    """Forgets the killers and halves the history, so a new search still profits from the last one."""
+    for killers in killer_moves:
+        killers[0] = killers[1] = None
+    for history in history_scores:
+        for index in range(4096):
+            history[index] >>= 1
+
+def _record_quiet_cutoff(move, depth, ply, is_white_turn):
+    killers = killer_moves[ply]
+    if killers[0] != move:
+        killers[1] = killers[0]
+        killers[0] = move
+    history_scores[is_white_turn][move & 4095] += depth * depth
+
+#SEE pruning: depths at which losing moves are skipped, and the loss (centipawns per ply) allowed
+see_pruning_max_depth = 2
+see_pruning_margin = 100
+
+#shared by every search, so results carry over from one move to the next
+transposition_table = TranspositionTable()
+
+#search statistics, reset by each search: nodes searched, beta cutoffs and how many came from the first move tried
+nodes_visited = 0
+beta_cutoffs = 0
+first_move_cutoffs = 0
+
+#numbers the searches, so helper processes can tell when a new one has started
+search_count = 0
+
+def _start_search():
+    global nodes_visited, beta_cutoffs, first_move_cutoffs, search_count
+    search_count += 1
+    nodes_visited = 0
+    beta_cutoffs = 0
+    first_move_cutoffs = 0
+    transposition_table.new_search()
+    _reset_move_ordering()
+
+#Scores are integers in evaluation units. A mate n plies from the root scores
+#mate_value - n for the side giving it, so shorter mates score higher; anything
+#at least mate_bound away from zero is a mate score.
+mate_value = 100_000_000
+mate_bound = mate_value - 2 * max_search_ply
+#wider than any score, for full windows
+infinity_score = mate_value + 1
+
+def is_mate_score(score):
+    return abs(score) >= mate_bound
+
+def mate_distance_plies(score):
+    """Plies to the mate a mate score announces, counted from where the score was found."""
+    return mate_value - abs(score)
+
+def _score_to_tt(score, ply):
+    """Mate scores are stored relative to the node rather than the root, so they stay valid elsewhere."""
+    if score >= mate_bound:
+        return score + ply
+    if score <= -mate_bound:
+        return score - ply
+    return score
+
+def _score_from_tt(score, ply):
+    if score >= mate_bound:
+        return score - ply
+    if score <= -mate_bound:
+        return score + ply
+    return score
+
+def _side_score(position, score):
+    """Converts between the search's side-to-move scores and White's point of view."""
+    return score if position.is_white_turn else -score
+
+
+def find_best_move(position, depth):
+    """Searches position to depth plies; the score is from White's point of view."""
+    _start_search()
+    best_move, score = search_root(position, depth)
+    return best_move, _side_score(position, score)
+
+
+class SearchAborted(Exception):
+    """Raised inside alphabeta once search_deadline has passed."""
+
+
+#perf_counter() time at which a running search must stop, None when there is no limit
+search_deadline = None
+#stops the running search once set; anything with is_set(), such as a multiprocessing.Event
+search_stop_event = None
+
+def _search_interrupted():
+    if search_deadline is not None and time.perf_counter() >= search_deadline:
+        return True
+    return search_stop_event is not None and search_stop_event.is_set()
+
+#aspiration windows: first depth searched with one, and its initial half-width in evaluation units
+aspiration_min_depth = 4
+aspiration_window = 50 * 100
+
+def iterative_deepening(position, max_depth=64, soft_time_limit=None, hard_time_limit=None, on_iteration=None,
+                        depths=None):
+    """Searches depth 1, 2, ... up to max_depth within the time limits (in seconds).
+
+    No new iteration starts once soft_time_limit has passed, and an iteration
+    still running at hard_time_limit is abandoned (the first one always
+    completes). Each iteration tries the previous best move first, finds the
+    rest of the previous results in the transposition table and searches a
+    narrow window around the previous score (see aspiration_search).
+    on_iteration(depth, best_move, score, nodes, elapsed) is called after each
+    completed iteration. Returns (best_move, score, depth) of the last one,
+    with scores from White's point of view. depths, if given, replaces the
+    depths 1..max_depth to search.
+    """
+    global search_deadline
+    _start_search()
+    start_time = time.perf_counter()
+    undo_depth = len(position.undo_stack)
+    best_move, best_value, completed_depth = None, 0, 0
+    try:
+        for depth in (depths if depths is not None else range(1, max_depth + 1)):
+            if completed_depth and hard_time_limit is not None:
+                search_deadline = start_time + hard_time_limit
+            try:
+                if depth >= aspiration_min_depth and completed_depth and not is_mate_score(best_value):
+                    move, value = aspiration_search(position, depth, best_move, best_value)
+                else:
+                    move, value = search_root(position, depth, best_move)
+            except SearchAborted:
+                while len(position.undo_stack) > undo_depth:
+                    if position.undo_stack[-1][0] is None:
+                        unmake_null_move(position)
+                    else:
+                        unmake_move(position)
+                break
+            best_move, best_value, completed_depth = move, value, depth
+            elapsed = time.perf_counter() - start_time
+            if on_iteration is not None:
+                on_iteration(depth, best_move, _side_score(position, best_value), nodes_visited, elapsed)
+            if best_move is None:
+                break #no legal moves
+            if is_mate_score(best_value) and mate_distance_plies(best_value) <= depth:
+                break #every line up to the mate was searched, a deeper search cannot find a shorter one
+            if soft_time_limit is not None and elapsed >= soft_time_limit:
+                break
+    finally:
+        search_deadline = None
+    return best_move, _side_score(position, best_value), completed_depth
+
+
+def aspiration_search(position, depth, first_move, previous_score):
+    """search_root in a window around previous_score, widened on the failing side until the score fits."""
+    delta = aspiration_window
+    alpha = max(previous_score - delta, -infinity_score)
+    beta = min(previous_score + delta, infinity_score)
+    while True:
+        best_move, value = search_root(position, depth, first_move, alpha, beta)
+        if value <= alpha and alpha > -infinity_score:
+            alpha = max(value - delta, -infinity_score)
+        elif value >= beta and beta < infinity_score:
+            beta = min(value + delta, infinity_score)
+            first_move = best_move
+        else:
+            return best_move, value
+        delta *= 4
 
-        if not king_in_check_after_move:
-            legal_moves.append(move)
-        global side_to_move
-        side_to_move = 'b' if side_to_move == 'w' else 'w'
 
-    return legal_moves
+#set by root_split.start_pool: searches the root moves of deep searches in a process pool,
+#called like _search_root_moves
+root_move_splitter = None
+#shallower searches are too small to be worth sending to other processes
+root_split_min_depth = 4
 
-def find_best_move(board, depth, is_maximizing_player, current_castling_rights, current_en_passant_target):
-    global nodes_visited
-    nodes_visited = 0
-    best_move = None
-    best_value = -float('inf') if is_maximizing_player else float('inf')
+def search_root(position, depth, first_move=None, alpha=-infinity_score, beta=infinity_score):
+    """The root of the search; first_move (or else the hash move) is searched first.
 
-    possible_moves = get_legal_moves(board, is_maximizing_player, current_castling_rights, current_en_passant_target)
+    Returns (best_move, score) with the score from the side to move's point of
+    view. A score outside (alpha, beta) is only a bound on the true one.
+    """
+    is_white_turn = position.is_white_turn
+    if first_move is None:
+        tt_entry = transposition_table.probe(position.zobrist_key)
+        first_move = tt_entry[3] if tt_entry is not None else None
+    possible_moves = list(staged_moves(position, first_move, killer_moves[0], history_scores[is_white_turn]))
 
     if not possible_moves:
-        if is_king_in_check(board, is_maximizing_player):
-             return None, (-float('inf') if is_maximizing_player else float('inf'))
-        else:
-             return None, 0
+        return None, (-mate_value if is_king_in_check(position, is_white_turn) else 0)
 
-    import random
-    random.shuffle(possible_moves)
-
-    alpha = -float('inf')
-    beta = float('inf')
+    if root_move_splitter is not None and depth >= root_split_min_depth and len(possible_moves) > 1:
+        best_move, best_value = root_move_splitter(position, depth, possible_moves, alpha, beta)
+    else:
+        best_move, best_value = _search_root_moves(position, depth, possible_moves, alpha, beta)
 
-    for move in possible_moves:
-        board_copy = list(board)
-        _captured_piece_info, next_cr, next_ep = make_move(board_copy, move, current_castling_rights, current_en_passant_target) # make_move flips global side_to_move
-        move_value = alphabeta(board_copy, depth - 1, alpha, beta, not is_maximizing_player, next_cr, next_ep)
+    if best_value <= alpha:
+        bound = bound_upper
+    elif best_value >= beta:
+        bound = bound_lower
+    else:
+        bound = bound_exact
+    transposition_table.store(position.zobrist_key, depth, best_value, bound, best_move)
+    return best_move, best_value
 
-        if is_maximizing_player:
-            if move_value > best_value:
-                best_value = move_value
-                best_move = move
-            alpha = max(alpha, best_value)
+def _search_root_moves(position, depth, moves, alpha, beta):
+    """Principal variation search of the root moves in order; returns (best_move, score)."""
+    best_move = None
+    best_value = -infinity_score
+    for move in moves:
+        make_move(position, move)
+        if best_move is None:
+            value = -alphabeta(position, depth - 1, -beta, -alpha, 1)
         else:
-             if move_value < best_value:
-                 best_value = move_value
-                 best_move = move
-             beta = min(beta, best_value)
-
-        if beta <= alpha:
-            break
-
-    if best_move is None and possible_moves:
-        print(f"WARNING: find_best_move finished loop but best_move is None. best_value={best_value}. Returning first move.")
-        best_move = possible_moves[0]
-
+            value = -alphabeta(position, depth - 1, -alpha - 1, -alpha, 1)
+            if alpha < value < beta:
+                value = -alphabeta(position, depth - 1, -beta, -alpha, 1)
+        unmake_move(position)
+
+        if value > best_value:
+            best_value = value
+            best_move = move
+        if value > alpha:
+            alpha = value
+            if alpha >= beta:
+                break
     return best_move, best_value
 
 
-def alphabeta(board, depth, alpha, beta, is_maximizing_player, current_castling_rights, current_en_passant_target):
-    global nodes_visited
+#Frontier pruning margins, in evaluation units (100 per centipawn), indexed by remaining depth.
+#Larger margins prune less and search more accurately; smaller ones save nodes.
+#futility: quiet moves are skipped when the static eval is this far outside the window
+futility_margins = [0, 200 * 100, 450 * 100]
+#razoring: the node is searched one ply shallower when the static eval is this far outside the window
+razoring_margins = [0, 0, 300 * 100, 600 * 100]
+#delta pruning (capture search): a capture whose victim cannot lift the stand-pat score to within
+#this of the window is skipped, and a node where not even a queen could is not searched at all
+delta_margin = 200 * 100
+
+#null-move pruning: minimum depth, and how much shallower the search after the pass is
+null_move_min_depth = 3
+null_move_reduction = 2
+#late move reductions: minimum depth, and how many moves are always searched at full depth
+lmr_min_depth = 3
+lmr_full_depth_moves = 3
+
+def has_non_pawn_material(position, is_white):
+    """False for king and pawns only, where passing is often the best move (zugzwang)."""
+    bitboards = position.bitboards
+    sign = 1 if is_white else -1
+    return bool(bitboards[2 * sign + 6] | bitboards[3 * sign + 6] | bitboards[4 * sign + 6] | bitboards[5 * sign + 6])
+
+def late_move_reduction(position, move, depth, moves_searched, ply):
+    """Plies to reduce a late quiet move by, to be called after it is made; 0 for no reduction."""
+    if (move >> 12) >= move_flag_promote_n or move in killer_moves[ply] \
+       or is_king_in_check(position, position.is_white_turn):
+        return 0
+    reduction = 1 if moves_searched <= 3 * lmr_full_depth_moves else 2
+    return min(reduction, depth - 2)
+
+def move_gives_check(position, move):
+    make_move(position, move)
+    gives_check = is_king_in_check(position, position.is_white_turn)
+    unmake_move(position)
+    return gives_check
+
+def alphabeta(position, depth, alpha, beta, ply=0, allow_null=True):
+    """Negamax principal variation search; the score is from the side to move's point of view.
+
+    The first move is searched with the full (alpha, beta) window and the rest
+    with a zero window, which only proves them no better than alpha; a move
+    that fails that proof is searched again with the full window. A node with
+    beta - alpha > 1 is on the principal variation.
+    """
+    global nodes_visited, beta_cutoffs, first_move_cutoffs, quiescence_nodes
     nodes_visited += 1
-
-    if depth == 0:
-        return evaluate_board(board)
-
-    possible_moves = get_legal_moves(board, is_maximizing_player, current_castling_rights, current_en_passant_target)
-
-    if not possible_moves:
-        if is_king_in_check(board, is_maximizing_player):
-             return -float('inf') if is_maximizing_player else float('inf')
+    if nodes_visited & 1023 == 0 and _search_interrupted():
+        raise SearchAborted
+
+    if depth <= 0:
+        quiescence_nodes = 0
+        return quiescence(position, alpha, beta, ply)
+
+    #mate distance pruning: no line from here beats a mate already found closer to the root
+    alpha = max(alpha, -mate_value + ply)
+    beta = min(beta, mate_value - ply - 1)
+    if alpha >= beta:
+        return alpha
+
+    key = position.zobrist_key
+    hash_move = None
+    tt_entry = transposition_table.probe(key)
+    if tt_entry is not None:
+        tt_depth, tt_score, tt_bound, hash_move = tt_entry
+        if tt_depth >= depth:
+            tt_score = _score_from_tt(tt_score, ply)
+            if tt_bound == bound_exact:
+                return tt_score
+            if tt_bound == bound_lower and tt_score >= beta:
+                return tt_score
+            if tt_bound == bound_upper and tt_score <= alpha:
+                return tt_score
+
+    is_white_turn = position.is_white_turn
+    is_pv_node = beta - alpha > 1
+    in_check = is_king_in_check(position, is_white_turn)
+    static_eval = None if in_check else _side_score(position, evaluate_position(position))
+
+    #razoring: far below the window near the leaves, search one ply shallower
+    if static_eval is not None and depth < len(razoring_margins) and razoring_margins[depth] \
+       and hash_move is None and static_eval + razoring_margins[depth] <= alpha:
+        depth -= 1
+
+    #null move: if passing still leaves the side to move at or above beta, a real move will too
+    if allow_null and not is_pv_node and depth >= null_move_min_depth and not in_check \
+       and static_eval >= beta and beta < mate_bound and has_non_pawn_material(position, is_white_turn):
+        make_null_move(position)
+        value = -alphabeta(position, depth - 1 - null_move_reduction, -beta, -beta + 1, ply + 1, False)
+        unmake_null_move(position)
+        if value >= beta:
+            return beta
+
+    original_alpha = alpha
+    moves_searched = 0
+    best_move = None
+    best_value = -infinity_score
+    #near the leaves, moves that lose more than see_pruning_margin per ply of depth are not searched
+    see_threshold = None
+    if depth <= see_pruning_max_depth and not in_check:
+        see_threshold = -see_pruning_margin * depth
+    try_reductions = depth >= lmr_min_depth and not in_check
+    #futility: quiet moves that do not give check cannot lift a hopeless static eval back into the window
+    futile_quiets = static_eval is not None and depth < len(futility_margins) \
+        and static_eval + futility_margins[depth] <= alpha
+
+    for move in staged_moves(position, hash_move, killer_moves[ply], history_scores[is_white_turn]):
+        if see_threshold is not None and moves_searched \
+           and static_exchange_eval_bb(position.bitboards, position.board, move) < see_threshold:
+            continue
+        if futile_quiets and moves_searched and is_quiet_move(position, move) \
+           and not move_gives_check(position, move):
+            continue
+        moves_searched += 1
+        reducible = try_reductions and moves_searched > lmr_full_depth_moves and is_quiet_move(position, move)
+        make_move(position, move)
+        if moves_searched == 1:
+            value = -alphabeta(position, depth - 1, -beta, -alpha, ply + 1)
         else:
-             return 0
-
-    if is_maximizing_player:
-        best_value = -float('inf')
-        for move in possible_moves:
-            board_copy = list(board)
-            _captured, next_cr, next_ep = make_move(board_copy, move, current_castling_rights, current_en_passant_target)
-            value = alphabeta(board_copy, depth - 1, alpha, beta, False, next_cr, next_ep)
-
-            best_value = max(best_value, value)
-            alpha = max(alpha, best_value)
-            if beta <= alpha:
+            reduction = late_move_reduction(position, move, depth, moves_searched, ply) if reducible else 0
+            value = -alphabeta(position, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+            if value > alpha and reduction:
+                value = -alphabeta(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+            if alpha < value < beta:
+                value = -alphabeta(position, depth - 1, -beta, -alpha, ply + 1)
+        unmake_move(position)
+
+        if value > best_value:
+            best_value = value
+            best_move = move
+        if value > alpha:
+            alpha = value
+            if alpha >= beta:
+                beta_cutoffs += 1
+                first_move_cutoffs += moves_searched == 1
+                if is_quiet_move(position, move):
+                    _record_quiet_cutoff(move, depth, ply, is_white_turn)
                 break
-        return best_value
-
-    else: 
-        best_value = float('inf')
-        for move in possible_moves:
-            board_copy = list(board)
-            _captured, next_cr, next_ep = make_move(board_copy, move, current_castling_rights, current_en_passant_target)
-            value = alphabeta(board_copy, depth - 1, alpha, beta, True, next_cr, next_ep)
 
-            best_value = min(best_value, value)
-            beta = min(beta, best_value)
-            if beta <= alpha:
-                break
+    if moves_searched == 0:
+        best_value = -mate_value + ply if in_check else 0
+        transposition_table.store(key, depth, _score_to_tt(best_value, ply), bound_exact, None)
         return best_value
 
-def make_move(board, move, current_castling_rights, current_ep_target):
-    global side_to_move
+    if best_value <= original_alpha:
+        bound = bound_upper
+    elif best_value >= beta:
+        bound = bound_lower
+    else:
+        bound = bound_exact
+    transposition_table.store(key, depth, _score_to_tt(best_value, ply), bound, best_move)
+    return best_value
+
+#material each piece type can add to a capture, for delta pruning
+capture_gain_values = [piece_values.get(piece_type, 0) * 100 for piece_type in range(7)]
+capture_gain_values[6] = 0
+#[black, white]: the rank a pawn of that color promotes from
+seventh_rank_masks = [0xFF << 48, 0xFF << 8]
+#most nodes a single quiescence search may visit below a depth-0 leaf; None for no cap
+quiescence_node_cap = None
+#nodes visited by the quiescence search under way, checked against quiescence_node_cap
+quiescence_nodes = 0
+
+def quiescence(position, alpha, beta, ply=0):
+    """Searches only captures and promotions until the position is quiet.
+
+    The side to move may stand pat on the static evaluation instead of
+    capturing, except in check, where every evasion is searched. Captures that
+    could not bring the score back to the window even by winning the victim for
+    free (delta pruning), and captures that lose material by static exchange
+    evaluation, are skipped. Scores are from the side to move's point of view.
+    """
+    global nodes_visited, quiescence_nodes
+    nodes_visited += 1
+    quiescence_nodes += 1
+    if nodes_visited & 1023 == 0 and _search_interrupted():
+        raise SearchAborted
+
+    is_white_turn = position.is_white_turn
+    in_check = is_king_in_check(position, is_white_turn)
+    if in_check:
+        moves = get_legal_moves(position)
+        if not moves:
+            return -mate_value + ply
+        stand_pat = None
+        best_value = -infinity_score
+    else:
+        stand_pat = _side_score(position, evaluate_position(position))
+        if quiescence_node_cap is not None and quiescence_nodes >= quiescence_node_cap:
+            return stand_pat
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        bitboards = position.bitboards
+        #with a pawn about to promote, the best capture could gain more than a queen
+        can_promote = bitboards[(1 if is_white_turn else -1) + 6] & seventh_rank_masks[is_white_turn]
+        if not can_promote and stand_pat + capture_gain_values[5] + delta_margin <= alpha:
+            return stand_pat
+        moves = generate_legal_noisy_moves_bb(bitboards, is_white_turn, position.en_passant_target,
+                                              legal_move_masks_bb(bitboards, is_white_turn))
+        if len(moves) > 1:
+            board = position.board
+            moves.sort(key=lambda move: noisy_move_score(board, move), reverse=True)
+        best_value = stand_pat
+
+    board = position.board
+    for move in moves:
+        if stand_pat is not None:
+            flag = move >> 12
+            gain = capture_gain_values[1 if flag == move_flag_en_passant else abs(board[(move >> 6) & 63])]
+            if flag >= move_flag_promote_n:
+                gain += capture_gain_values[flag - 6] - capture_gain_values[1]
+            if stand_pat + gain + delta_margin <= alpha:
+                continue
+            if is_losing_capture(position, move):
+                continue
+
+        make_move(position, move)
+        value = -quiescence(position, -beta, -alpha, ply + 1)
+        unmake_move(position)
+
+        if value > best_value:
+            best_value = value
+        if value > alpha:
+            alpha = value
+            if alpha >= beta:
+                break
+    return best_value
 
-    from_index, to_index = move[:2]
-    move_info = move[2] if len(move) > 2 else None
+def _move_piece(position, piece, from_index, to_index):
+    board = position.board
+    bitboards = position.bitboards
+    board[from_index] = 0
+    board[to_index] = piece
+    squares = position.piece_squares[piece > 0]
+    squares[squares.index(from_index)] = to_index
+    move_bits = (1 << from_index) | (1 << to_index)
+    bitboards[piece + 6] ^= move_bits
+    bitboards[white_occupancy_slot if piece > 0 else black_occupancy_slot] ^= move_bits
+    keys = zobrist_piece_keys[piece + 6]
+    position.zobrist_key ^= keys[from_index] ^ keys[to_index]
+    table = piece_square_tables_mg[piece + 6]
+    position.score_mg += table[to_index] - table[from_index]
+    table = piece_square_tables_eg[piece + 6]
+    position.score_eg += table[to_index] - table[from_index]
+
+def _remove_piece(position, piece, index):
+    position.board[index] = 0
+    position.piece_squares[piece > 0].remove(index)
+    bit = 1 << index
+    position.bitboards[piece + 6] ^= bit
+    position.bitboards[white_occupancy_slot if piece > 0 else black_occupancy_slot] ^= bit
+    position.zobrist_key ^= zobrist_piece_keys[piece + 6][index]
+    position.score_mg -= piece_square_tables_mg[piece + 6][index]
+    position.score_eg -= piece_square_tables_eg[piece + 6][index]
+    position.phase -= phase_weights[piece + 6]
+
+def _put_piece(position, piece, index):
+    position.board[index] = piece
+    position.piece_squares[piece > 0].append(index)
+    bit = 1 << index
+    position.bitboards[piece + 6] ^= bit
+    position.bitboards[white_occupancy_slot if piece > 0 else black_occupancy_slot] ^= bit
+    position.zobrist_key ^= zobrist_piece_keys[piece + 6][index]
+    position.score_mg += piece_square_tables_mg[piece + 6][index]
+    position.score_eg += piece_square_tables_eg[piece + 6][index]
+    position.phase += phase_weights[piece + 6]
+
+def _change_piece(position, index, new_piece):
+    old_piece = position.board[index]
+    bitboards = position.bitboards
+    bit = 1 << index
+    bitboards[old_piece + 6] ^= bit
+    bitboards[new_piece + 6] ^= bit
+    position.board[index] = new_piece
+    position.zobrist_key ^= zobrist_piece_keys[old_piece + 6][index] ^ zobrist_piece_keys[new_piece + 6][index]
+    position.score_mg += piece_square_tables_mg[new_piece + 6][index] - piece_square_tables_mg[old_piece + 6][index]
+    position.score_eg += piece_square_tables_eg[new_piece + 6][index] - piece_square_tables_eg[old_piece + 6][index]
+    position.phase += phase_weights[new_piece + 6] - phase_weights[old_piece + 6]
+
+def _update_state_key(position, old_castling_rights, new_castling_rights, old_ep_target, new_ep_target):
+    """XORs the side to move, castling and en passant changes into the Zobrist key."""
+    key = position.zobrist_key ^ zobrist_black_to_move_key
+    if old_castling_rights != new_castling_rights:
+        key ^= castling_zobrist_key(old_castling_rights) ^ castling_zobrist_key(new_castling_rights)
+    if old_ep_target is not None:
+        key ^= zobrist_ep_file_keys[old_ep_target % 8]
+    if new_ep_target is not None:
+        key ^= zobrist_ep_file_keys[new_ep_target % 8]
+    position.zobrist_key = key
+
+def make_move(position, move):
+    """Plays move on position in place and returns the captured piece (0 if none).
+
+    The state needed to take it back is pushed on position.undo_stack.
+    """
+    board = position.board
+    from_index, to_index, flag = move & 63, (move >> 6) & 63, move >> 12
     piece = board[from_index]
-    captured_piece = board[to_index] 
     is_white_moving = piece > 0
+    current_castling_rights = position.castling_rights
 
-    board[to_index] = piece
-    board[from_index] = 0
-
-    actual_captured_piece = captured_piece 
-
-    if move_info == 'ep':
+    capture_index = to_index
+    if flag == move_flag_en_passant:
         capture_index = to_index + 8 if is_white_moving else to_index - 8
-        if 0 <= capture_index < 64:
-             actual_captured_piece = board[capture_index] 
-             board[capture_index] = 0
-        else:
-             print(f"ERROR: Invalid EP capture index. Move: {move}, Target Index: {capture_index}")
-             actual_captured_piece = 0 
+    captured_piece = board[capture_index]
+    if captured_piece != 0:
+        _remove_piece(position, captured_piece, capture_index)
 
-    elif move_info in ('q', 'r', 'n', 'b', 'Q', 'R', 'N', 'B'):
-        _p_color = 1 if is_white_moving else -1
-        _p_val = {'q': 5, 'r': 4, 'n': 2, 'b': 3}.get(move_info.lower())
-        board[to_index] = _p_val * _p_color
+    _move_piece(position, piece, from_index, to_index)
 
-    elif move_info == 'castle_k':
-        _rank = from_index // 8; _r_from= _rank*8+7; _r_to=_rank*8+5
-        board[_r_to] = board[_r_from]; board[_r_from] = 0
-    elif move_info == 'castle_q':
-        _rank = from_index // 8; _r_from= _rank*8+0; _r_to=_rank*8+3
-        board[_r_to] = board[_r_from]; board[_r_from] = 0
+    if flag >= move_flag_promote_n:
+        _change_piece(position, to_index, (flag - 6) if is_white_moving else (6 - flag))
+    elif flag == move_flag_castle_k:
+        _rank = from_index // 8
+        _move_piece(position, board[_rank*8+7], _rank*8+7, _rank*8+5)
+    elif flag == move_flag_castle_q:
+        _rank = from_index // 8
+        _move_piece(position, board[_rank*8+0], _rank*8+0, _rank*8+3)
 
     new_ep_target = None
-    piece_after_move = board[to_index]
-    if abs(piece_after_move) == 1 and abs(from_index // 8 - to_index // 8) == 2:
+    piece_type = abs(piece)
+    if piece_type == 1 and abs(from_index - to_index) == 16:
         new_ep_target = (from_index + to_index) // 2
 
+    if piece_type == 6:
+        position.king_squares[is_white_moving] = to_index
+
     new_castling_rights = current_castling_rights
+    if new_castling_rights:
+        if piece_type == 6:
+            if is_white_moving: new_castling_rights = new_castling_rights.replace('K','').replace('Q','')
+            else: new_castling_rights = new_castling_rights.replace('k','').replace('q','')
+        elif piece_type == 4 and from_index in castling_right_by_rook_square:
+            new_castling_rights = new_castling_rights.replace(castling_right_by_rook_square[from_index], '')
+        if abs(captured_piece) == 4 and to_index in castling_right_by_rook_square:
+            new_castling_rights = new_castling_rights.replace(castling_right_by_rook_square[to_index], '')
+
+    position.undo_stack.append((move, captured_piece, current_castling_rights, position.en_passant_target))
+    _update_state_key(position, current_castling_rights, new_castling_rights, position.en_passant_target, new_ep_target)
+    position.castling_rights = new_castling_rights
+    position.en_passant_target = new_ep_target
+    position.is_white_turn = not position.is_white_turn
+
+    return captured_piece
+
+
+def make_null_move(position):
+    """Passes the turn (for null-move pruning); undone with unmake_null_move."""
+    position.undo_stack.append((None, 0, position.castling_rights, position.en_passant_target))
+    _update_state_key(position, position.castling_rights, position.castling_rights, position.en_passant_target, None)
+    position.en_passant_target = None
+    position.is_white_turn = not position.is_white_turn
+
+def unmake_null_move(position):
+    _, _, castling_rights, previous_ep_target = position.undo_stack.pop()
+    _update_state_key(position, castling_rights, castling_rights, None, previous_ep_target)
+    position.en_passant_target = previous_ep_target
+    position.is_white_turn = not position.is_white_turn
+
+
+def unmake_move(position):
+    """Takes back the last move played with make_move and returns that move."""
+    move, captured_piece, previous_castling_rights, previous_ep_target = position.undo_stack.pop()
+    board = position.board
+
+    from_index, to_index, flag = move & 63, (move >> 6) & 63, move >> 12
+    piece = board[to_index]
+    is_white_moving = piece > 0
+
+    if flag >= move_flag_promote_n:
+        pawn = 1 if is_white_moving else -1
+        _change_piece(position, to_index, pawn)
+        piece = pawn
+    elif flag == move_flag_castle_k:
+        _rank = from_index // 8
+        _move_piece(position, board[_rank*8+5], _rank*8+5, _rank*8+7)
+    elif flag == move_flag_castle_q:
+        _rank = from_index // 8
+        _move_piece(position, board[_rank*8+3], _rank*8+3, _rank*8+0)
+
+    _move_piece(position, piece, to_index, from_index)
     if abs(piece) == 6:
-        if is_white_moving: new_castling_rights = new_castling_rights.replace('K','').replace('Q','')
-        else: new_castling_rights = new_castling_rights.replace('k','').replace('q','')
-    elif abs(piece) == 4:
-        if from_index == u.square_to_index_1d('a1'): new_castling_rights = new_castling_rights.replace('Q','')
-        elif from_index == u.square_to_index_1d('h1'): new_castling_rights = new_castling_rights.replace('K','')
-        elif from_index == u.square_to_index_1d('a8'): new_castling_rights = new_castling_rights.replace('q','')
-        elif from_index == u.square_to_index_1d('h8'): new_castling_rights = new_castling_rights.replace('k','')
-    if actual_captured_piece != 0 and abs(actual_captured_piece) == 4:
-        if to_index == u.square_to_index_1d('a1'): new_castling_rights = new_castling_rights.replace('Q','')
-        elif to_index == u.square_to_index_1d('h1'): new_castling_rights = new_castling_rights.replace('K','')
-        elif to_index == u.square_to_index_1d('a8'): new_castling_rights = new_castling_rights.replace('q','')
-        elif to_index == u.square_to_index_1d('h8'): new_castling_rights = new_castling_rights.replace('k','')
+        position.king_squares[is_white_moving] = from_index
 
-    side_to_move = 'b' if side_to_move == 'w' else 'w'
+    if captured_piece != 0:
+        capture_index = to_index
+        if flag == move_flag_en_passant:
+            capture_index = to_index + 8 if is_white_moving else to_index - 8
+        _put_piece(position, captured_piece, capture_index)
 
-    return actual_captured_piece, new_castling_rights, new_ep_target
+    _update_state_key(position, position.castling_rights, previous_castling_rights,
+                      position.en_passant_target, previous_ep_target)
+    position.castling_rights = previous_castling_rights
+    position.en_passant_target = previous_ep_target
+    position.is_white_turn = not position.is_white_turn
+    return move
 
 
 #test/debug board
@@ -337,25 +984,22 @@ def create_test_board_minimax_start():
     return u.get_starting_board_array()
 
 if __name__ == "__main__":
-    current_board = create_test_board_minimax_start()
-    side_to_move = 'w'
-    castling_rights = "KQkq"
-    en_passant_target = None
+    current_position = Position(create_test_board_minimax_start(), True, "KQkq", None)
     depth_to_search = 4 
 
     print("Initial Board:")
-    u.print_board(current_board)
-    print(f"Side to move: {side_to_move}")
-    print(f"Castling Rights: {castling_rights}")
-    print(f"EP Target: {en_passant_target}")
+    u.print_board(current_position.board)
+    print(f"Side to move: {current_position.side_to_move()}")
+    print(f"Castling Rights: {current_position.castling_rights}")
+    print(f"EP Target: {current_position.en_passant_target}")
 
 
     profiler = cProfile.Profile()
     profiler.enable()
 
     start_time = time.time()
-    is_white = (side_to_move == 'w')
-    best_move_found, best_eval = find_best_move(current_board, depth_to_search, is_white, castling_rights, en_passant_target)
+    is_white = current_position.is_white_turn
+    best_move_found, best_eval = find_best_move(current_position, depth_to_search)
     end_time = time.time()
 
     profiler.disable()
@@ -364,23 +1008,25 @@ if __name__ == "__main__":
 
     print("\n--- Search Finished ---")
     if best_move_found:
-        from_sq = u.index_1d_to_square(best_move_found[0])
-        to_sq = u.index_1d_to_square(best_move_found[1])
-        move_info = best_move_found[2] if len(best_move_found) > 2 else ""
+        best_move_tuple = move_to_tuple(best_move_found)
+        from_sq = u.index_1d_to_square(best_move_tuple[0])
+        to_sq = u.index_1d_to_square(best_move_tuple[1])
+        move_info = best_move_tuple[2] if len(best_move_tuple) > 2 else ""
         print(f"Best move found: {from_sq}-{to_sq} {move_info}")
         print(f"Evaluation: {best_eval:.2f} (from {'White' if is_white else 'Black'}'s perspective, approx centipawns)")
         print(f"Search Time: {search_time:.4f} seconds")
         print(f"Depth: {depth_to_search}")
-        make_move(current_board, best_move_found, castling_rights, en_passant_target)
+        make_move(current_position, best_move_found)
 
         print("\nBoard after best move:")
-        u.print_board(current_board)
-        print(f"New Side to move: {side_to_move}")
-        print(f"New Castling Rights: {castling_rights}")
+        u.print_board(current_position.board)
+        en_passant_target = current_position.en_passant_target
+        print(f"New Side to move: {current_position.side_to_move()}")
+        print(f"New Castling Rights: {current_position.castling_rights}")
         print(f"New EP Target: {en_passant_target} ({u.index_1d_to_square(en_passant_target) if en_passant_target is not None else 'None'})")
 
     else:
-        if is_king_in_check(current_board, is_white):
+        if is_king_in_check(current_position, is_white):
             print("Checkmate! {} wins.".format("Black" if is_white else "White"))
         else:
             print("Stalemate! Draw.")
@@ -3,8 +3,10 @@ from PIL import Image, ImageTk
 import utils as u
 import time
 import chess_engine 
+from move_gen import move_to_tuple, tuple_to_move
 from chess_engine import ( 
     create_test_board_minimax_start,
+    starting_position,
     find_best_move,
     make_move,
     get_legal_moves,
@@ -17,10 +19,9 @@ class ChessGUI(tk.Tk):
         self.title("Chess Engine GUI")
         self.geometry("600x640")
 
-        self.board_array = u.get_starting_board_array()
-        self.castling_rights = chess_engine.castling_rights
-        self.en_passant_target = chess_engine.en_passant_target
-        self.is_white_turn = (chess_engine.side_to_move == 'w')
+        self.position = starting_position()
+        self.board_array = self.position.board
+        self.is_white_turn = self.position.is_white_turn
 
         self.canvas = tk.Canvas(self, width=480, height=480, borderwidth=1, relief="solid")
         self.canvas.pack(pady=10)
@@ -197,7 +198,7 @@ class ChessGUI(tk.Tk):
                 self.clear_highlights()
                 self.highlight_square(index_1d, "blue")
                 try:
-                    all_legal_moves = get_legal_moves(self.board_array, True, self.castling_rights, self.en_passant_target)
+                    all_legal_moves = [move_to_tuple(m) for m in get_legal_moves(self.position)]
                     self.possible_moves_from_selected = [m for m in all_legal_moves if m[0] == self.from_square_index]
                     self.highlight_legal_moves(self.possible_moves_from_selected)
                     if not self.possible_moves_from_selected:
@@ -235,7 +236,7 @@ class ChessGUI(tk.Tk):
                 print(f"  Changed selection TO: {square_notation} (Value: {clicked_piece_value})")
                 self.highlight_square(index_1d, "blue")
                 try:
-                    all_legal_moves = get_legal_moves(self.board_array, True, self.castling_rights, self.en_passant_target)
+                    all_legal_moves = [move_to_tuple(m) for m in get_legal_moves(self.position)]
                     self.possible_moves_from_selected = [m for m in all_legal_moves if m[0] == self.from_square_index]
                     self.highlight_legal_moves(self.possible_moves_from_selected)
                     if not self.possible_moves_from_selected:
@@ -259,16 +260,14 @@ class ChessGUI(tk.Tk):
 
         print(f"Making user move: {move_tuple}")
         try:
-            _ = make_move(self.board_array, move_tuple, self.castling_rights, self.en_passant_target)
+            _ = make_move(self.position, tuple_to_move(move_tuple))
 
 
             self.move_history.append(move_tuple)
             self.update_history_display()
 
-            self.castling_rights = chess_engine.castling_rights
-            self.en_passant_target = chess_engine.en_passant_target
-            self.is_white_turn = (chess_engine.side_to_move == 'w')
-            print(f"  State after user move: CR='{self.castling_rights}', EP={self.en_passant_target}, Turn={'W' if self.is_white_turn else 'B'}")
+            self.is_white_turn = self.position.is_white_turn
+            print(f"  State after user move: CR='{self.position.castling_rights}', EP={self.position.en_passant_target}, Turn={'W' if self.is_white_turn else 'B'}")
             
             self.update_board_pieces()
             self.update_status_label()
@@ -291,33 +290,29 @@ class ChessGUI(tk.Tk):
         if self.is_white_turn: return
 
         print(f"Debug: Engine (Black) thinking... Current State:")
-        print(f"  Turn: B, CR='{self.castling_rights}', EP={self.en_passant_target}")
+        print(f"  Turn: B, CR='{self.position.castling_rights}', EP={self.position.en_passant_target}")
         self.status_label.config(text="Engine thinking...")
         self.update_idletasks()
 
         try:
             search_depth = 4
             print(f"Debug: Calling find_best_move (depth={search_depth}, is_maximizing=False)")
-            engine_best_move, engine_eval = find_best_move(
-                self.board_array, depth=search_depth, is_maximizing_player=False,
-                current_castling_rights=self.castling_rights,
-                current_en_passant_target=self.en_passant_target
-            )
+            engine_best_move, engine_eval = find_best_move(self.position, depth=search_depth)
+            if engine_best_move is not None:
+                engine_best_move = move_to_tuple(engine_best_move)
             print(f"Debug: find_best_move returned: move={engine_best_move}, eval={engine_eval}")
 
             if engine_best_move:
                 engine_move_str_formatted = self.format_move_algebraic(engine_best_move)
                 self.engine_move_display.config(text=f"Engine's Last Move: {engine_move_str_formatted}")
 
-                _ = make_move(self.board_array, engine_best_move, self.castling_rights, self.en_passant_target)
+                _ = make_move(self.position, tuple_to_move(engine_best_move))
 
                 self.move_history.append(engine_best_move)
                 self.update_history_display()
 
-                self.castling_rights = chess_engine.castling_rights
-                self.en_passant_target = chess_engine.en_passant_target
-                self.is_white_turn = (chess_engine.side_to_move == 'w')
-                print(f"Debug: State AFTER engine move: CR='{self.castling_rights}', EP={self.en_passant_target}, Turn=W")
+                self.is_white_turn = self.position.is_white_turn
+                print(f"Debug: State AFTER engine move: CR='{self.position.castling_rights}', EP={self.position.en_passant_target}, Turn=W")
 
                 self.update_board_pieces()
                 self.update_status_label()
@@ -337,13 +332,11 @@ class ChessGUI(tk.Tk):
     def check_game_over(self, for_engine_turn):
         """Checks if the player whose turn it is has legal moves, updates status if over."""
         player_is_white = not for_engine_turn
-        current_player_legal_moves = get_legal_moves(
-            self.board_array, player_is_white, self.castling_rights, self.en_passant_target
-        )
+        current_player_legal_moves = get_legal_moves(self.position)
 
         if not current_player_legal_moves:
             try:
-                king_in_check = is_king_in_check(self.board_array, player_is_white)
+                king_in_check = is_king_in_check(self.position, player_is_white)
                 if king_in_check:
                     winner = "Black" if player_is_white else "White"
                     print(f"Checkmate! {winner} wins.")
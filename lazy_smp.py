@@ -0,0 +1,171 @@
+"""Lazy SMP: the same search run by several processes that share one transposition table.
+
+Each worker process searches the root the main process is searching, skipping
+a staggered set of depths so the processes spread over different iterations,
+and every process reads and writes the one hash table, kept in
+multiprocessing.shared_memory (see transposition). The processes split no work
+explicitly; they profit from each other's stored results and move orders. The
+answer is the deepest iteration completed by any process, and the search ends
+as soon as one of them completes max_depth.
+
+Workers are processes rather than threads because the search is pure Python,
+and threads would take turns on the one interpreter lock. They stay alive
+between searches, so their start-up cost is paid once.
+"""
+import multiprocessing
+import queue
+import time
+
+import chess_engine
+
+#per helper, as in the first Lazy SMP engines: helper i skips the depths d for which
+#(d + skip_phases[i]) // skip_sizes[i] is odd
+skip_sizes = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4]
+skip_phases = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7]
+
+#seconds to wait on the result queue before checking that the workers are still alive
+worker_poll_interval = 0.1
+
+workers = []
+job_queues = []
+result_queue = None
+#set to stop every process's search at once
+stop_event = None
+#name of the shared table block the workers are attached to
+shared_table_name = None
+search_count = 0
+
+
+def helper_depths(helper_index, max_depth):
+    """The depths helper helper_index searches, out of 1..max_depth."""
+    skip_size = skip_sizes[helper_index % len(skip_sizes)]
+    skip_phase = skip_phases[helper_index % len(skip_phases)]
+    return [depth for depth in range(1, max_depth + 1) if (depth + skip_phase) // skip_size % 2 == 0]
+
+
+def set_worker_count(count):
+    """Runs count worker processes beside the main one; 0 goes back to a single-process search."""
+    global result_queue, stop_event, shared_table_name
+    stop_workers()
+    if count <= 0:
+        return
+    shared_table_name, slot_count = chess_engine.transposition_table.share()
+    result_queue = multiprocessing.Queue()
+    stop_event = multiprocessing.Event()
+    for helper_index in range(count):
+        job_queue = multiprocessing.Queue()
+        worker = multiprocessing.Process(
+            target=_worker_main, name=f"lazy-smp-{helper_index}", daemon=True,
+            args=(helper_index, shared_table_name, slot_count, job_queue, result_queue, stop_event))
+        worker.start()
+        workers.append(worker)
+        job_queues.append(job_queue)
+
+
+def stop_workers():
+    """Ends the worker processes and their share of the hash table (see TranspositionTable.share)."""
+    global result_queue, stop_event, shared_table_name
+    for job_queue in job_queues:
+        job_queue.put(None)
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+    workers.clear()
+    job_queues.clear()
+    if shared_table_name is not None:
+        chess_engine.transposition_table.unshare()
+    result_queue = stop_event = shared_table_name = None
+
+
+def _worker_main(helper_index, table_name, slot_count, job_queue, results, stop):
+    chess_engine.transposition_table.attach_shared(table_name, slot_count)
+    chess_engine.search_stop_event = stop
+    chess_engine.root_move_splitter = None #the root_split pool belongs to the main process
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        search_id, position, max_depth, generation = job
+        #_start_search moves this process and the main one on to the same next generation
+        chess_engine.transposition_table.generation = generation
+
+        def report_iteration(depth, best_move, score, nodes, elapsed):
+            results.put((search_id, helper_index, depth, best_move, score, nodes))
+            if depth >= max_depth:
+                stop.set()
+
+        chess_engine.iterative_deepening(position, max_depth, on_iteration=report_iteration,
+                                         depths=helper_depths(helper_index, max_depth))
+        results.put((search_id, helper_index, None, None, None, chess_engine.nodes_visited))
+    #the main process owns the table; copying it out here would only delay the exit
+    chess_engine.transposition_table.detach()
+
+
+def parallel_search(position, max_depth=64, soft_time_limit=None, hard_time_limit=None, on_iteration=None):
+    """chess_engine.iterative_deepening run by the main process and every worker together.
+
+    Takes the same arguments and returns the same (best_move, score, depth),
+    for the deepest iteration any process completed. The time limits are kept
+    by the main process, which stops the workers when it finishes.
+    on_iteration is called whenever some process completes a new deepest
+    iteration, with the nodes of all processes.
+    """
+    global search_count
+    if not workers:
+        return chess_engine.iterative_deepening(position, max_depth, soft_time_limit, hard_time_limit, on_iteration)
+    table = chess_engine.transposition_table
+    if table.shared_block.name != shared_table_name:
+        set_worker_count(len(workers)) #a Hash change gave the table a new block
+
+    search_count += 1
+    search_id = search_count
+    for job_queue in job_queues:
+        #put() pickles in a background thread, so it gets a copy the main search will not be moving pieces on
+        job_queue.put((search_id, position.copy(), max_depth, table.generation))
+    start_time = time.perf_counter()
+    deepest = [None, 0, 0] #best_move, score, depth
+    helper_nodes = [0] * len(workers)
+    running = set(range(len(workers)))
+
+    def record_iteration(depth, best_move, score):
+        if depth > deepest[2]:
+            deepest[:] = [best_move, score, depth]
+            if on_iteration is not None:
+                on_iteration(depth, best_move, score, chess_engine.nodes_visited + sum(helper_nodes),
+                             time.perf_counter() - start_time)
+
+    def read_result(timeout):
+        """Handles one worker message; False if there was none within timeout (None: do not wait)."""
+        try:
+            if timeout is None:
+                message = result_queue.get_nowait()
+            else:
+                message = result_queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        message_search_id, helper_index, depth, best_move, score, nodes = message
+        if message_search_id == search_id:
+            helper_nodes[helper_index] = nodes
+            if depth is None:
+                running.discard(helper_index)
+            else:
+                record_iteration(depth, best_move, score)
+        return True
+
+    def main_iteration(depth, best_move, score, nodes, elapsed):
+        while read_result(None):
+            pass
+        record_iteration(depth, best_move, score)
+
+    chess_engine.search_stop_event = stop_event
+    try:
+        chess_engine.iterative_deepening(position, max_depth, soft_time_limit, hard_time_limit, main_iteration)
+    finally:
+        chess_engine.search_stop_event = None
+        stop_event.set()
+        while running:
+            if not read_result(worker_poll_interval):
+                running.intersection_update([index for index in running if workers[index].is_alive()])
+        stop_event.clear()
+    return tuple(deepest)
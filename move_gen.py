@@ -14,64 +14,113 @@ bishop_diagonal_directions = [(-1, 1), (-1, -1), (1, 1), (1, -1)]
 pawn_attack_directions_white = [(-1, -1), (-1, 1)] 
 pawn_attack_directions_black = [(1, -1), (1, 1)] 
 
+#Move encoding: a move is the int from_index | to_index << 6 | flag << 12,
+#decoded in place as move & 63, (move >> 6) & 63 and move >> 12
+move_flag_normal = 0
+move_flag_en_passant = 1
+move_flag_castle_k = 2
+move_flag_castle_q = 3
+#promotion flags are the promoted piece type + 6
+move_flag_promote_n = 8
+move_flag_promote_b = 9
+move_flag_promote_r = 10
+move_flag_promote_q = 11
+promotion_flags = (move_flag_promote_q, move_flag_promote_r, move_flag_promote_n, move_flag_promote_b)
+
+move_flag_by_tag = {'ep': move_flag_en_passant, 'castle_k': move_flag_castle_k, 'castle_q': move_flag_castle_q,
+                    'q': move_flag_promote_q, 'r': move_flag_promote_r, 'n': move_flag_promote_n, 'b': move_flag_promote_b}
+move_tag_by_flag = {flag: tag for tag, flag in move_flag_by_tag.items()}
+
+def encode_move(from_index, to_index, flag=move_flag_normal):
+    return from_index | (to_index << 6) | (flag << 12)
+
+def move_to_tuple(move):
+    """Decodes a move into the (from, to[, tag]) tuple form, e.g. (52, 36) or (12, 4, 'q')."""
+    flag = move >> 12
+    if flag == move_flag_normal:
+        return (move & 63, (move >> 6) & 63)
+    return (move & 63, (move >> 6) & 63, move_tag_by_flag[flag])
+
+def move_to_uci_string(move):
+    """The move in UCI long algebraic notation, e.g. e2e4 or e7e8q."""
+    flag = move >> 12
+    promotion_char = move_tag_by_flag[flag] if flag >= move_flag_promote_n else ""
+    return f"{u.index_1d_to_square(move & 63)}{u.index_1d_to_square((move >> 6) & 63)}{promotion_char}"
+
+def tuple_to_move(move_tuple):
+    """Encodes a (from, to[, tag]) tuple; promotion tags may be upper or lower case."""
+    flag = move_flag_normal
+    if len(move_tuple) > 2 and move_tuple[2]:
+        flag = move_flag_by_tag[move_tuple[2] if move_tuple[2] in move_flag_by_tag else move_tuple[2].lower()]
+    return encode_move(move_tuple[0], move_tuple[1], flag)
+
 def is_valid_square(rank, file):
     return 0 <= rank <= 7 and 0 <= file <= 7
 
 def is_valid_index(index):
     return 0 <= index <= 63
 
+#Precomputed per-square target tables (built once at import)
+def _offset_targets(index, offsets):
+    rank, file = divmod(index, 8)
+    return [(rank + dr) * 8 + file + df for dr, df in offsets if is_valid_square(rank + dr, file + df)]
+
+knight_targets = [_offset_targets(i, knight_move_offsets) for i in range(64)]
+king_targets = [_offset_targets(i, king_move_offsets) for i in range(64)]
+#squares attacked BY a pawn of the given color standing on the index
+white_pawn_attack_targets = [_offset_targets(i, pawn_attack_directions_white) for i in range(64)]
+black_pawn_attack_targets = [_offset_targets(i, pawn_attack_directions_black) for i in range(64)]
+
+#Precomputed rays: per square, one list of indices per direction that leaves the square
+def _ray(index, dr, df):
+    rank, file = divmod(index, 8)
+    ray = []
+    rank, file = rank + dr, file + df
+    while is_valid_square(rank, file):
+        ray.append(rank * 8 + file)
+        rank, file = rank + dr, file + df
+    return ray
+
+rook_rays = [[ray for ray in (_ray(i, dr, df) for dr, df in rook_directions) if ray] for i in range(64)]
+bishop_rays = [[ray for ray in (_ray(i, dr, df) for dr, df in bishop_diagonal_directions) if ray] for i in range(64)]
+
 def is_square_attacked(board, square_index, attacking_color_is_white):
-    target_rank, target_file = divmod(square_index, 8)
     opponent_color_sign = 1 if attacking_color_is_white else -1
 
-    pawn_attack_dirs = pawn_attack_directions_black if attacking_color_is_white else pawn_attack_directions_white
-    for dr, df in pawn_attack_dirs:
-        check_rank, check_file = target_rank + dr, target_file + df
-        if is_valid_square(check_rank, check_file):
-            check_index = check_rank * 8 + check_file
+    #a pawn attacks the square if the square "attacks" it with the opposite pawn pattern
+    pawn_sources = black_pawn_attack_targets if attacking_color_is_white else white_pawn_attack_targets
+    attacking_pawn = opponent_color_sign
+    for check_index in pawn_sources[square_index]:
+        if board[check_index] == attacking_pawn:
+            return True
+
+    attacking_knight = opponent_color_sign * 2
+    for check_index in knight_targets[square_index]:
+        if board[check_index] == attacking_knight:
+            return True
+
+    attacking_bishop = opponent_color_sign * 3
+    attacking_rook = opponent_color_sign * 4
+    attacking_queen = opponent_color_sign * 5
+    for ray in rook_rays[square_index]:
+        for check_index in ray:
             piece = board[check_index]
-            if piece == opponent_color_sign * 1:
-                return True
-
-    for dr, df in knight_move_offsets:
-        check_rank, check_file = target_rank + dr, target_file + df
-        if is_valid_square(check_rank, check_file):
-            check_index = check_rank * 8 + check_file
+            if piece != 0:
+                if piece == attacking_rook or piece == attacking_queen:
+                    return True
+                break
+    for ray in bishop_rays[square_index]:
+        for check_index in ray:
             piece = board[check_index]
-            if piece == opponent_color_sign * 2:
-                return True
-
-    sliding_directions = rook_directions + bishop_diagonal_directions
-    for dr, df in sliding_directions:
-        current_rank, current_file = target_rank + dr, target_file + df
-        while is_valid_square(current_rank, current_file):
-            current_index = current_rank * 8 + current_file
-            piece = board[current_index]
             if piece != 0:
-                piece_type = abs(piece)
-                is_opponent_piece = (piece * opponent_color_sign > 0)
-
-                if is_opponent_piece:
-                    is_rook_move = (dr == 0 or df == 0)
-                    is_bishop_move = (abs(dr) == abs(df))
-
-                    if piece_type == 5: #Q
-                        return True
-                    if piece_type == 4 and is_rook_move: #R on r line
-                        return True
-                    if piece_type == 3 and is_bishop_move: #B on b line
-                        return True
+                if piece == attacking_bishop or piece == attacking_queen:
+                    return True
                 break
-            current_rank += dr
-            current_file += df
 
-    for dr, df in king_move_offsets:
-        check_rank, check_file = target_rank + dr, target_file + df
-        if is_valid_square(check_rank, check_file):
-            check_index = check_rank * 8 + check_file
-            piece = board[check_index]
-            if piece == opponent_color_sign * 6:
-                return True
+    attacking_king = opponent_color_sign * 6
+    for check_index in king_targets[square_index]:
+        if board[check_index] == attacking_king:
+            return True
 
     return False
 
@@ -82,22 +131,17 @@ def generate_rook_moves(board, rook_index):
     if abs(rook_piece) not in [4, 5]:
         return possible_moves
     is_white = rook_piece > 0
-    start_rank, start_file = divmod(rook_index, 8)
 
-    for dr, df in rook_directions:
-        current_rank, current_file = start_rank + dr, start_file + df
-        while is_valid_square(current_rank, current_file):
-            current_index = current_rank * 8 + current_file
+    for ray in rook_rays[rook_index]:
+        for current_index in ray:
             target_piece = board[current_index]
 
             if target_piece == 0:
-                possible_moves.append((rook_index, current_index))
+                possible_moves.append(rook_index | (current_index << 6))
             else:
                 if (target_piece > 0 and not is_white) or (target_piece < 0 and is_white):
-                    possible_moves.append((rook_index, current_index))
+                    possible_moves.append(rook_index | (current_index << 6))
                 break
-            current_rank += dr
-            current_file += df
     return possible_moves
 
 def generate_bishop_moves(board, bishop_index):
@@ -106,22 +150,17 @@ def generate_bishop_moves(board, bishop_index):
     if abs(bishop_piece) not in [3, 5]:
         return possible_moves
     is_white = bishop_piece > 0
-    start_rank, start_file = divmod(bishop_index, 8)
 
-    for dr, df in bishop_diagonal_directions:
-        current_rank, current_file = start_rank + dr, start_file + df
-        while is_valid_square(current_rank, current_file):
-            current_index = current_rank * 8 + current_file
+    for ray in bishop_rays[bishop_index]:
+        for current_index in ray:
             target_piece = board[current_index]
 
             if target_piece == 0:
-                possible_moves.append((bishop_index, current_index))
+                possible_moves.append(bishop_index | (current_index << 6))
             else:
                 if (target_piece > 0 and not is_white) or (target_piece < 0 and is_white):
-                    possible_moves.append((bishop_index, current_index))
+                    possible_moves.append(bishop_index | (current_index << 6))
                 break
-            current_rank += dr
-            current_file += df
     return possible_moves
 
 def generate_queen_moves(board, queen_index):
@@ -137,17 +176,13 @@ def generate_knight_moves(board, knight_index):
     if abs(knight_piece) != 2:
         return possible_moves
     is_white = knight_piece > 0
-    start_rank, start_file = divmod(knight_index, 8)
-
-    for dr, df in knight_move_offsets:
-        target_rank, target_file = start_rank + dr, start_file + df
-        if is_valid_square(target_rank, target_file):
-            target_index = target_rank * 8 + target_file
-            target_piece = board[target_index]
-            if target_piece == 0 or \
-               (target_piece > 0 and not is_white) or \
-               (target_piece < 0 and is_white):
-                possible_moves.append((knight_index, target_index))
+
+    for target_index in knight_targets[knight_index]:
+        target_piece = board[target_index]
+        if target_piece == 0 or \
+           (target_piece > 0 and not is_white) or \
+           (target_piece < 0 and is_white):
+            possible_moves.append(knight_index | (target_index << 6))
     return possible_moves
 
 def generate_pawn_moves(board, pawn_index, en_passant_target_index):
@@ -160,44 +195,39 @@ def generate_pawn_moves(board, pawn_index, en_passant_target_index):
     start_rank, start_file = divmod(pawn_index, 8)
     direction = -1 if is_white else 1
     promotion_rank = 0 if is_white else 7
-    promotion_pieces = ['q', 'r', 'n', 'b']
 
     one_forward_rank = start_rank + direction
     if is_valid_square(one_forward_rank, start_file):
         one_forward_index = one_forward_rank * 8 + start_file
         if board[one_forward_index] == 0:
             if one_forward_rank == promotion_rank:
-                for promo_char in promotion_pieces:
-                    possible_moves.append((pawn_index, one_forward_index, promo_char))
+                for promo_flag in promotion_flags:
+                    possible_moves.append(pawn_index | (one_forward_index << 6) | (promo_flag << 12))
             else:
-                possible_moves.append((pawn_index, one_forward_index))
+                possible_moves.append(pawn_index | (one_forward_index << 6))
 
             initial_rank = 6 if is_white else 1
             if start_rank == initial_rank:
                 two_forward_rank = start_rank + 2 * direction
                 two_forward_index = two_forward_rank * 8 + start_file
                 if board[two_forward_index] == 0:
-                    possible_moves.append((pawn_index, two_forward_index))
-
-    capture_dirs = [(-1, -1), (-1, 1)] if is_white else [(1, -1), (1, 1)] 
-    for dr, df in capture_dirs:
-        capture_rank, capture_file = start_rank + dr, start_file + df
-        if is_valid_square(capture_rank, capture_file):
-            capture_index = capture_rank * 8 + capture_file
-            target_piece = board[capture_index]
-
-            if target_piece != 0 and ((target_piece > 0 and not is_white) or (target_piece < 0 and is_white)):
-                if capture_rank == promotion_rank:
-                     for promo_char in promotion_pieces:
-                         possible_moves.append((pawn_index, capture_index, promo_char))
-                else:
-                    possible_moves.append((pawn_index, capture_index))
-
-            correct_ep_rank = 3 if is_white else 4
-            if capture_index == en_passant_target_index and start_rank == correct_ep_rank:
-
-                 if is_valid_square(capture_rank, capture_file):
-                    possible_moves.append((pawn_index, capture_index, 'ep'))
+                    possible_moves.append(pawn_index | (two_forward_index << 6))
+
+    capture_targets = white_pawn_attack_targets if is_white else black_pawn_attack_targets
+    capture_rank = one_forward_rank
+    correct_ep_rank = 3 if is_white else 4
+    for capture_index in capture_targets[pawn_index]:
+        target_piece = board[capture_index]
+
+        if target_piece != 0 and ((target_piece > 0 and not is_white) or (target_piece < 0 and is_white)):
+            if capture_rank == promotion_rank:
+                 for promo_flag in promotion_flags:
+                     possible_moves.append(pawn_index | (capture_index << 6) | (promo_flag << 12))
+            else:
+                possible_moves.append(pawn_index | (capture_index << 6))
+
+        if capture_index == en_passant_target_index and start_rank == correct_ep_rank:
+            possible_moves.append(encode_move(pawn_index, capture_index, move_flag_en_passant))
     return possible_moves
 
 
@@ -208,18 +238,14 @@ def generate_king_moves(board, king_index, current_castling_rights):
         return possible_moves
 
     is_white = king_piece > 0
-    start_rank, start_file = divmod(king_index, 8)
     opponent_is_white = not is_white
 
-    for dr, df in king_move_offsets:
-        target_rank, target_file = start_rank + dr, start_file + df
-        if is_valid_square(target_rank, target_file):
-            target_index = target_rank * 8 + target_file
-            target_piece = board[target_index]
-            if target_piece == 0 or \
-               (target_piece > 0 and not is_white) or \
-               (target_piece < 0 and is_white):
-                possible_moves.append((king_index, target_index))
+    for target_index in king_targets[king_index]:
+        target_piece = board[target_index]
+        if target_piece == 0 or \
+           (target_piece > 0 and not is_white) or \
+           (target_piece < 0 and is_white):
+            possible_moves.append(king_index | (target_index << 6))
 
 
     king_char = 'K' if is_white else 'k'
@@ -240,7 +266,7 @@ def generate_king_moves(board, king_index, current_castling_rights):
             f_sq_safe = not is_square_attacked(board, f_sq_idx, opponent_is_white)
             g_sq_safe = not is_square_attacked(board, g_sq_idx, opponent_is_white)
             if king_not_in_check and f_sq_safe and g_sq_safe:
-                possible_moves.append((king_index, g_sq_idx, 'castle_k'))
+                possible_moves.append(encode_move(king_index, g_sq_idx, move_flag_castle_k))
 
         castle_right = queen_char in current_castling_rights
         rook_present = board[queen_side_rook_index] == rook_value
@@ -253,10 +279,34 @@ def generate_king_moves(board, king_index, current_castling_rights):
             d_sq_safe = not is_square_attacked(board, d_sq_idx, opponent_is_white)
             c_sq_safe = not is_square_attacked(board, c_sq_idx, opponent_is_white)
             if king_not_in_check and d_sq_safe and c_sq_safe:
-                 possible_moves.append((king_index, c_sq_idx, 'castle_q')) 
+                 possible_moves.append(encode_move(king_index, c_sq_idx, move_flag_castle_q)) 
 
     return possible_moves
 
+def generate_piece_moves(board, index, current_castling_rights, current_en_passant_target):
+    """Pseudo-legal moves of whatever piece stands on index."""
+    piece_type = abs(board[index])
+    if piece_type == 1:
+        return generate_pawn_moves(board, index, current_en_passant_target)
+    elif piece_type == 2:
+        return generate_knight_moves(board, index)
+    elif piece_type == 3:
+        return generate_bishop_moves(board, index)
+    elif piece_type == 4:
+        return generate_rook_moves(board, index)
+    elif piece_type == 5:
+        return generate_queen_moves(board, index)
+    elif piece_type == 6:
+        return generate_king_moves(board, index, current_castling_rights)
+    return []
+
+def is_pseudo_legal_move(board, move, is_white_turn, current_castling_rights, current_en_passant_target):
+    """Checks a move from elsewhere (hash table, killer slot) against the moves of the piece it names."""
+    piece = board[move & 63]
+    if piece == 0 or (piece > 0) != is_white_turn:
+        return False
+    return move in generate_piece_moves(board, move & 63, current_castling_rights, current_en_passant_target)
+
 def generate_pseudo_legal_moves(board, is_white_turn, current_castling_rights, current_en_passant_target):
     all_moves = []
     for index in range(64):
@@ -265,21 +315,451 @@ def generate_pseudo_legal_moves(board, is_white_turn, current_castling_rights, c
 
         piece_is_white = piece > 0
         if piece_is_white == is_white_turn:
-            piece_type = abs(piece)
-            moves = []
-            if piece_type == 1:
-                moves = generate_pawn_moves(board, index, current_en_passant_target)
-            elif piece_type == 2:
-                moves = generate_knight_moves(board, index)
-            elif piece_type == 3:
-                moves = generate_bishop_moves(board, index)
-            elif piece_type == 4:
-                moves = generate_rook_moves(board, index)
-            elif piece_type == 5:
-                moves = generate_queen_moves(board, index)
-            elif piece_type == 6:
-                moves = generate_king_moves(board, index, current_castling_rights)
+            moves = generate_piece_moves(board, index, current_castling_rights, current_en_passant_target)
             if moves: 
                 all_moves.extend(moves)
 
-    return all_moves
\ No newline at end of file
+    return all_moves
+
+#Bitboards: bit i of a bitboard is board index i (a8 = bit 0, h1 = bit 63)
+full_board_mask = (1 << 64) - 1
+file_a_mask = sum(1 << (rank * 8) for rank in range(8))
+file_h_mask = file_a_mask << 7
+not_file_a_mask = full_board_mask ^ file_a_mask
+not_file_h_mask = full_board_mask ^ file_h_mask
+rank_8_mask = 0xFF
+rank_1_mask = 0xFF << 56
+rank_3_mask = 0xFF << 40
+rank_6_mask = 0xFF << 16
+
+#bitboards list layout: bitboards[piece + 6] per signed piece code, plus occupancy
+white_occupancy_slot = 13
+black_occupancy_slot = 14
+bitboard_slots = 15
+
+#(shift, wrap mask) per direction; positive shifts move towards h1
+rook_shift_directions = [(-8, full_board_mask), (8, full_board_mask),
+                         (-1, not_file_h_mask), (1, not_file_a_mask)]
+bishop_shift_directions = [(-7, not_file_a_mask), (-9, not_file_h_mask),
+                           (9, not_file_a_mask), (7, not_file_h_mask)]
+
+def _targets_to_mask(targets):
+    mask = 0
+    for index in targets:
+        mask |= 1 << index
+    return mask
+
+knight_attack_masks = [_targets_to_mask(targets) for targets in knight_targets]
+king_attack_masks = [_targets_to_mask(targets) for targets in king_targets]
+white_pawn_attack_masks = [_targets_to_mask(targets) for targets in white_pawn_attack_targets]
+black_pawn_attack_masks = [_targets_to_mask(targets) for targets in black_pawn_attack_targets]
+
+
+def board_to_bitboards(board):
+    """Converts a 64-entry board array to the bitboards list used by the *_bb functions."""
+    bitboards = [0] * bitboard_slots
+    for index in range(64):
+        piece = board[index]
+        if piece == 0: continue
+        bit = 1 << index
+        bitboards[piece + 6] |= bit
+        if piece > 0:
+            bitboards[white_occupancy_slot] |= bit
+        else:
+            bitboards[black_occupancy_slot] |= bit
+    return bitboards
+
+def bitboards_to_board(bitboards):
+    """Converts a bitboards list back to a 64-entry board array."""
+    board = [0] * 64
+    for piece in (1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6):
+        bb = bitboards[piece + 6]
+        while bb:
+            lsb = bb & -bb
+            board[lsb.bit_length() - 1] = piece
+            bb ^= lsb
+    return board
+
+def sliding_attacks_bb(square_index, occupied, shift_directions):
+    attacks = 0
+    for shift, wrap_mask in shift_directions:
+        ray = 1 << square_index
+        while ray:
+            ray = ((ray << shift) if shift > 0 else (ray >> -shift)) & wrap_mask
+            attacks |= ray
+            ray &= ~occupied
+    return attacks
+
+#Sliding attack lookup: per square, a table keyed by the occupancy of the squares
+#that can block (the ray squares minus the board edge). A dict keyed on the masked
+#occupancy does the job of a magic multiply without the 128-bit product.
+def _blocker_mask(rays):
+    mask = 0
+    for ray in rays:
+        for index in ray[:-1]:
+            mask |= 1 << index
+    return mask
+
+def _build_attack_table(square_index, mask, shift_directions):
+    table = {}
+    subset = 0
+    while True:
+        table[subset] = sliding_attacks_bb(square_index, subset, shift_directions)
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+    return table
+
+rook_blocker_masks = [_blocker_mask(rays) for rays in rook_rays]
+bishop_blocker_masks = [_blocker_mask(rays) for rays in bishop_rays]
+rook_attack_tables = [_build_attack_table(i, rook_blocker_masks[i], rook_shift_directions) for i in range(64)]
+bishop_attack_tables = [_build_attack_table(i, bishop_blocker_masks[i], bishop_shift_directions) for i in range(64)]
+
+def rook_attacks_bb(square_index, occupied):
+    return rook_attack_tables[square_index][occupied & rook_blocker_masks[square_index]]
+
+def bishop_attacks_bb(square_index, occupied):
+    return bishop_attack_tables[square_index][occupied & bishop_blocker_masks[square_index]]
+
+#empty-board slider reach, used to skip the lookup when no slider is lined up
+rook_reach_masks = [table[0] for table in rook_attack_tables]
+bishop_reach_masks = [table[0] for table in bishop_attack_tables]
+
+#between_masks[a][b]: squares strictly between a and b when they share a line, else 0
+def _build_between_masks():
+    between = [[0] * 64 for _ in range(64)]
+    for index in range(64):
+        for ray in rook_rays[index] + bishop_rays[index]:
+            mask = 0
+            for ray_index in ray:
+                between[index][ray_index] = mask
+                mask |= 1 << ray_index
+    return between
+
+between_masks = _build_between_masks()
+
+def is_square_attacked_bb(bitboards, square_index, attacking_color_is_white):
+    sign = 1 if attacking_color_is_white else -1
+    pawn_masks = black_pawn_attack_masks if attacking_color_is_white else white_pawn_attack_masks
+    if pawn_masks[square_index] & bitboards[sign + 6]:
+        return True
+    if knight_attack_masks[square_index] & bitboards[2 * sign + 6]:
+        return True
+    if king_attack_masks[square_index] & bitboards[6 * sign + 6]:
+        return True
+    occupied = bitboards[white_occupancy_slot] | bitboards[black_occupancy_slot]
+    queens = bitboards[5 * sign + 6]
+    rooks_queens = (bitboards[4 * sign + 6] | queens) & rook_reach_masks[square_index]
+    if rooks_queens and rook_attacks_bb(square_index, occupied) & rooks_queens:
+        return True
+    bishops_queens = (bitboards[3 * sign + 6] | queens) & bishop_reach_masks[square_index]
+    if bishops_queens and bishop_attacks_bb(square_index, occupied) & bishops_queens:
+        return True
+    return False
+
+def attackers_to_bb(bitboards, square_index, occupied):
+    """Bitboard of the pieces of both colors that attack square_index when the board holds occupied."""
+    rooks_queens = bitboards[4 + 6] | bitboards[5 + 6] | bitboards[-4 + 6] | bitboards[-5 + 6]
+    bishops_queens = bitboards[3 + 6] | bitboards[5 + 6] | bitboards[-3 + 6] | bitboards[-5 + 6]
+    return ((black_pawn_attack_masks[square_index] & bitboards[1 + 6])
+            | (white_pawn_attack_masks[square_index] & bitboards[-1 + 6])
+            | (knight_attack_masks[square_index] & (bitboards[2 + 6] | bitboards[-2 + 6]))
+            | (king_attack_masks[square_index] & (bitboards[6 + 6] | bitboards[-6 + 6]))
+            | (rook_attacks_bb(square_index, occupied) & rooks_queens)
+            | (bishop_attacks_bb(square_index, occupied) & bishops_queens))
+
+#piece values (centipawns) used by the static exchange evaluation, indexed by piece type
+see_piece_values = [0, 100, 320, 330, 500, 900, 20000]
+
+def static_exchange_eval_bb(bitboards, board, move):
+    """Material (centipawns) the moving side ends up with after the exchange move starts.
+
+    Both sides keep recapturing on the target square with their least valuable
+    attacker, x-rays included, and either side may stop when continuing would
+    lose material. Pins are ignored. A quiet move scores 0 if the square is
+    safe and minus the moved piece's value if it simply hangs.
+    """
+    from_index, to_index, flag = move & 63, (move >> 6) & 63, move >> 12
+    piece = board[from_index]
+    occupied = (bitboards[white_occupancy_slot] | bitboards[black_occupancy_slot]) ^ (1 << from_index)
+    if flag == move_flag_en_passant:
+        captured_value = see_piece_values[1]
+        occupied ^= 1 << (to_index + 8 if piece > 0 else to_index - 8)
+    else:
+        captured_value = see_piece_values[abs(board[to_index])]
+    on_square_value = see_piece_values[abs(piece)]
+    if flag >= move_flag_promote_n:
+        on_square_value = see_piece_values[flag - 6]
+        captured_value += on_square_value - see_piece_values[1]
+
+    #gains[d]: what the side making capture d wins if the exchange stopped right after it
+    gains = [captured_value]
+    side_is_white = piece < 0
+    attackers = attackers_to_bb(bitboards, to_index, occupied) & occupied
+    while True:
+        side_attackers = attackers & bitboards[white_occupancy_slot if side_is_white else black_occupancy_slot]
+        if not side_attackers:
+            break
+        sign = 1 if side_is_white else -1
+        for attacker_type in range(1, 7):
+            candidates = side_attackers & bitboards[attacker_type * sign + 6]
+            if candidates:
+                break
+        if attacker_type == 6 and attackers & ~side_attackers:
+            break #the king cannot capture onto a square the other side still attacks
+        gains.append(on_square_value - gains[-1])
+        on_square_value = see_piece_values[attacker_type]
+        occupied ^= candidates & -candidates
+        attackers = attackers_to_bb(bitboards, to_index, occupied) & occupied
+        side_is_white = not side_is_white
+
+    while len(gains) > 1:
+        last_gain = gains.pop()
+        gains[-1] = -max(-gains[-1], last_gain)
+    return gains[0]
+
+def generate_pseudo_legal_moves_bb(bitboards, is_white_turn, current_castling_rights, current_en_passant_target):
+    """Bitboard counterpart of generate_pseudo_legal_moves; produces the same set of moves."""
+    return _generate_moves_bb(bitboards, is_white_turn, current_castling_rights, current_en_passant_target,
+                              full_board_mask, 0, None)
+
+def _generate_moves_bb(bitboards, is_white_turn, current_castling_rights, current_en_passant_target,
+                       evasion_mask, pinned, pin_masks, include_noisy=True, include_quiet=True):
+    """Shared body of the pseudo-legal and legal bitboard generators.
+
+    Non-king moves must land on evasion_mask, and a piece in pinned may only move
+    along pin_masks[from_index]. pin_masks is None for pseudo-legal generation;
+    otherwise king moves and en passant are verified with move_leaves_king_in_check_bb.
+    Noisy moves are captures, en passant and promotions; quiet moves are the rest
+    (castling included).
+    """
+    all_moves = []
+    legal_only = pin_masks is not None
+    sign = 1 if is_white_turn else -1
+    if is_white_turn:
+        own = bitboards[white_occupancy_slot]
+        enemy = bitboards[black_occupancy_slot]
+    else:
+        own = bitboards[black_occupancy_slot]
+        enemy = bitboards[white_occupancy_slot]
+    occupied = own | enemy
+    empty = full_board_mask ^ occupied
+    targets_mask = ((enemy if include_noisy else 0) | (empty if include_quiet else 0))
+    king_targets_mask = targets_mask
+    targets_mask &= evasion_mask
+
+    #Pawns, set-wise: shift every pawn at once and recover from_index from the shift
+    pawns = bitboards[sign + 6]
+    if is_white_turn:
+        single_pushes = (pawns >> 8) & empty
+        double_pushes = ((single_pushes & rank_3_mask) >> 8) & empty
+        push_back = 8
+        captures = [((pawns >> 9) & not_file_h_mask & enemy, 9),
+                    ((pawns >> 7) & not_file_a_mask & enemy, 7)]
+        promotion_mask = rank_8_mask
+        ep_attacker_masks = black_pawn_attack_masks
+    else:
+        single_pushes = (pawns << 8) & empty
+        double_pushes = ((single_pushes & rank_6_mask) << 8) & empty
+        push_back = -8
+        captures = [((pawns << 7) & not_file_h_mask & enemy, -7),
+                    ((pawns << 9) & not_file_a_mask & enemy, -9)]
+        promotion_mask = rank_1_mask
+        ep_attacker_masks = white_pawn_attack_masks
+
+    pawn_target_sets = []
+    if include_quiet:
+        pawn_target_sets += [(single_pushes & (full_board_mask ^ promotion_mask), push_back),
+                             (double_pushes, 2 * push_back)]
+    if include_noisy:
+        pawn_target_sets += [(single_pushes & promotion_mask, push_back)] + captures
+    for targets, back in pawn_target_sets:
+        targets &= evasion_mask
+        while targets:
+            lsb = targets & -targets
+            to_index = lsb.bit_length() - 1
+            from_index = to_index + back
+            targets ^= lsb
+            if pinned and (1 << from_index) & pinned and not lsb & pin_masks[from_index]:
+                continue
+            if lsb & promotion_mask:
+                for promo_flag in promotion_flags:
+                    all_moves.append(from_index | (to_index << 6) | (promo_flag << 12))
+            else:
+                all_moves.append(from_index | (to_index << 6))
+    if include_noisy and current_en_passant_target is not None:
+        ep_attackers = ep_attacker_masks[current_en_passant_target] & pawns
+        while ep_attackers:
+            lsb = ep_attackers & -ep_attackers
+            move = encode_move(lsb.bit_length() - 1, current_en_passant_target, move_flag_en_passant)
+            if not legal_only or not move_leaves_king_in_check_bb(bitboards, move, is_white_turn):
+                all_moves.append(move)
+            ep_attackers ^= lsb
+
+    queens = bitboards[5 * sign + 6]
+    for pieces, attack_fn in ((bitboards[2 * sign + 6], None),
+                              (bitboards[3 * sign + 6] | queens, bishop_attacks_bb),
+                              (bitboards[4 * sign + 6] | queens, rook_attacks_bb)):
+        while pieces:
+            lsb = pieces & -pieces
+            from_index = lsb.bit_length() - 1
+            pieces ^= lsb
+            if attack_fn is None:
+                targets = knight_attack_masks[from_index] & targets_mask
+            else:
+                targets = attack_fn(from_index, occupied) & targets_mask
+            if lsb & pinned:
+                targets &= pin_masks[from_index]
+            while targets:
+                target_lsb = targets & -targets
+                all_moves.append(from_index | ((target_lsb.bit_length() - 1) << 6))
+                targets ^= target_lsb
+
+    king = bitboards[6 * sign + 6]
+    if king:
+        king_index = king.bit_length() - 1
+        targets = king_attack_masks[king_index] & king_targets_mask
+        while targets:
+            lsb = targets & -targets
+            move = king_index | ((lsb.bit_length() - 1) << 6)
+            if not legal_only or not move_leaves_king_in_check_bb(bitboards, move, is_white_turn):
+                all_moves.append(move)
+            targets ^= lsb
+
+        king_home_index = 60 if is_white_turn else 4
+        if include_quiet and king_index == king_home_index:
+            opponent_is_white = not is_white_turn
+            rooks = bitboards[4 * sign + 6]
+            king_char = 'K' if is_white_turn else 'k'
+            queen_char = 'Q' if is_white_turn else 'q'
+            if king_char in current_castling_rights and rooks & (1 << (king_home_index + 3)) \
+               and not occupied & (0b110 << king_home_index):
+                if not is_square_attacked_bb(bitboards, king_home_index, opponent_is_white) and \
+                   not is_square_attacked_bb(bitboards, king_home_index + 1, opponent_is_white) and \
+                   not is_square_attacked_bb(bitboards, king_home_index + 2, opponent_is_white):
+                    all_moves.append(encode_move(king_index, king_home_index + 2, move_flag_castle_k))
+            if queen_char in current_castling_rights and rooks & (1 << (king_home_index - 4)) \
+               and not occupied & (0b111 << (king_home_index - 3)):
+                if not is_square_attacked_bb(bitboards, king_home_index, opponent_is_white) and \
+                   not is_square_attacked_bb(bitboards, king_home_index - 1, opponent_is_white) and \
+                   not is_square_attacked_bb(bitboards, king_home_index - 2, opponent_is_white):
+                    all_moves.append(encode_move(king_index, king_home_index - 2, move_flag_castle_q))
+
+    return all_moves
+
+def move_leaves_king_in_check_bb(bitboards, move, is_white_turn):
+    """Plays a pseudo-legal move on scratch occupancy and tests the mover's king.
+
+    Only occupancy and the opponent's piece sets matter for the test, so the
+    castling rook and the promoted piece type are not tracked here.
+    """
+    from_index, to_index = move & 63, (move >> 6) & 63
+    from_bit = 1 << from_index
+    to_bit = 1 << to_index
+    sign = 1 if is_white_turn else -1
+    if is_white_turn:
+        own = bitboards[white_occupancy_slot]
+        enemy = bitboards[black_occupancy_slot]
+    else:
+        own = bitboards[black_occupancy_slot]
+        enemy = bitboards[white_occupancy_slot]
+
+    king = bitboards[6 * sign + 6]
+    if not king:
+        return False
+    king_index = to_index if king & from_bit else king.bit_length() - 1
+
+    captured_bits = to_bit
+    if move >> 12 == move_flag_en_passant:
+        captured_bits = 1 << (to_index + 8 if is_white_turn else to_index - 8)
+    own = (own ^ from_bit) | to_bit
+    enemy &= ~captured_bits
+    occupied = own | enemy
+
+    enemy_sign = -sign
+    pawn_masks = white_pawn_attack_masks if is_white_turn else black_pawn_attack_masks
+    if pawn_masks[king_index] & bitboards[enemy_sign + 6] & enemy:
+        return True
+    if knight_attack_masks[king_index] & bitboards[2 * enemy_sign + 6] & enemy:
+        return True
+    if king_attack_masks[king_index] & bitboards[6 * enemy_sign + 6]:
+        return True
+    queens = bitboards[5 * enemy_sign + 6]
+    rooks_queens = (bitboards[4 * enemy_sign + 6] | queens) & enemy & rook_reach_masks[king_index]
+    if rooks_queens and rook_attacks_bb(king_index, occupied) & rooks_queens:
+        return True
+    bishops_queens = (bitboards[3 * enemy_sign + 6] | queens) & enemy & bishop_reach_masks[king_index]
+    if bishops_queens and bishop_attacks_bb(king_index, occupied) & bishops_queens:
+        return True
+    return False
+
+def legal_move_masks_bb(bitboards, is_white_turn):
+    """Returns (evasion_mask, pinned, pin_masks) for the side to move.
+
+    Checkers and pinned pieces are worked out once from the king square:
+    evasion_mask holds the squares a non-king move must land on (everything,
+    the checker and the squares between it and the king, or nothing on a
+    double check) and pin_masks maps each pinned piece to its pin line.
+    """
+    sign = 1 if is_white_turn else -1
+    king = bitboards[6 * sign + 6]
+    if not king:
+        return full_board_mask, 0, {}
+    king_index = king.bit_length() - 1
+    own = bitboards[white_occupancy_slot if is_white_turn else black_occupancy_slot]
+    occupied = bitboards[white_occupancy_slot] | bitboards[black_occupancy_slot]
+
+    enemy_sign = -sign
+    enemy_queens = bitboards[5 * enemy_sign + 6]
+    enemy_rooks_queens = bitboards[4 * enemy_sign + 6] | enemy_queens
+    enemy_bishops_queens = bitboards[3 * enemy_sign + 6] | enemy_queens
+    pawn_masks = white_pawn_attack_masks if is_white_turn else black_pawn_attack_masks
+
+    checkers = (pawn_masks[king_index] & bitboards[enemy_sign + 6]) | \
+               (knight_attack_masks[king_index] & bitboards[2 * enemy_sign + 6])
+    pinned = 0
+    pin_masks = {}
+    snipers = (rook_reach_masks[king_index] & enemy_rooks_queens) | \
+              (bishop_reach_masks[king_index] & enemy_bishops_queens)
+    king_between = between_masks[king_index]
+    while snipers:
+        lsb = snipers & -snipers
+        sniper_index = lsb.bit_length() - 1
+        snipers ^= lsb
+        blockers = king_between[sniper_index] & occupied
+        if not blockers:
+            checkers |= lsb
+        elif blockers & (blockers - 1) == 0 and blockers & own:
+            pinned |= blockers
+            pin_masks[blockers.bit_length() - 1] = king_between[sniper_index] | lsb
+
+    if not checkers:
+        evasion_mask = full_board_mask
+    elif checkers & (checkers - 1) == 0:
+        evasion_mask = checkers | king_between[checkers.bit_length() - 1]
+    else:
+        evasion_mask = 0
+    return evasion_mask, pinned, pin_masks
+
+def generate_legal_moves_bb(bitboards, is_white_turn, current_castling_rights, current_en_passant_target):
+    """Generates strictly legal moves.
+
+    With the masks from legal_move_masks_bb, ordinary moves come out legal by
+    construction; only king moves and en passant are played on scratch
+    occupancy and tested.
+    """
+    evasion_mask, pinned, pin_masks = legal_move_masks_bb(bitboards, is_white_turn)
+    return _generate_moves_bb(bitboards, is_white_turn, current_castling_rights, current_en_passant_target,
+                              evasion_mask, pinned, pin_masks)
+
+def generate_legal_noisy_moves_bb(bitboards, is_white_turn, current_en_passant_target, legal_masks):
+    """Legal captures, en passant captures and promotions; legal_masks comes from legal_move_masks_bb."""
+    evasion_mask, pinned, pin_masks = legal_masks
+    return _generate_moves_bb(bitboards, is_white_turn, '', current_en_passant_target,
+                              evasion_mask, pinned, pin_masks, include_quiet=False)
+
+def generate_legal_quiet_moves_bb(bitboards, is_white_turn, current_castling_rights, legal_masks):
+    """Legal non-capturing, non-promoting moves, castling included."""
+    evasion_mask, pinned, pin_masks = legal_masks
+    return _generate_moves_bb(bitboards, is_white_turn, current_castling_rights, None,
+                              evasion_mask, pinned, pin_masks, include_noisy=False)
@@ -0,0 +1,120 @@
+"""Perft: counts the leaf nodes of the legal move tree to check and time move generation.
+
+Usage:
+    python perft.py --suite [--depth N]       run the reference positions up to depth N
+    python perft.py [--fen FEN] --depth N     count one position
+    python perft.py [--fen FEN] --depth N --divide
+"""
+import argparse
+import sys
+import time
+
+import chess_engine
+from move_gen import move_to_uci_string
+
+#(name, fen, {depth: nodes}) with the published node counts
+perft_suite = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position4_mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+
+def perft(position, depth):
+    """Number of leaf nodes depth plies below position (leaves are counted, not played)."""
+    moves = chess_engine.get_legal_moves(position)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        chess_engine.make_move(position, move)
+        nodes += perft(position, depth - 1)
+        chess_engine.unmake_move(position)
+    return nodes
+
+
+def perft_divide(position, depth):
+    """Returns [(move, nodes)] with the perft count below each root move."""
+    results = []
+    for move in chess_engine.get_legal_moves(position):
+        chess_engine.make_move(position, move)
+        results.append((move, perft(position, depth - 1)))
+        chess_engine.unmake_move(position)
+    return results
+
+
+def format_nps(nodes, elapsed):
+    return f"{nodes / elapsed:,.0f}" if elapsed > 0 else "-"
+
+
+def run_divide(position, depth, out=sys.stdout):
+    """Prints the per-root-move split and totals; returns the node count."""
+    start_time = time.perf_counter()
+    results = perft_divide(position, depth)
+    elapsed = time.perf_counter() - start_time
+    total_nodes = 0
+    for move, nodes in sorted(results, key=lambda result: move_to_uci_string(result[0])):
+        print(f"{move_to_uci_string(move)}: {nodes}", file=out)
+        total_nodes += nodes
+    print(f"\nNodes searched: {total_nodes}", file=out)
+    print(f"Time: {elapsed:.3f}s  NPS: {format_nps(total_nodes, elapsed)}", file=out)
+    out.flush()
+    return total_nodes
+
+
+def run_suite(max_depth):
+    """Runs every reference position up to max_depth; returns True when all counts match."""
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected_counts in perft_suite:
+        for depth in sorted(expected_counts):
+            if depth > max_depth:
+                break
+            position = chess_engine.position_from_fen(fen)
+            start_time = time.perf_counter()
+            nodes = perft(position, depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            passed = nodes == expected_counts[depth]
+            all_passed = all_passed and passed
+            status = "ok" if passed else f"FAIL (expected {expected_counts[depth]})"
+            print(f"{name:<20} depth {depth}  {nodes:>10}  {elapsed:8.3f}s  "
+                  f"{format_nps(nodes, elapsed):>10} nps  {status}")
+            sys.stdout.flush()
+    print(f"\nTotal: {total_nodes} nodes in {total_time:.3f}s, {format_nps(total_nodes, total_time)} nps")
+    print("All counts match." if all_passed else "MISMATCHES FOUND.")
+    return all_passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move generator perft")
+    parser.add_argument("--fen", default=perft_suite[0][1])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("--suite", action="store_true", help="run the reference positions up to --depth")
+    args = parser.parse_args()
+
+    if args.suite:
+        sys.exit(0 if run_suite(args.depth) else 1)
+
+    position = chess_engine.position_from_fen(args.fen)
+    if args.divide:
+        run_divide(position, args.depth)
+    else:
+        start_time = time.perf_counter()
+        nodes = perft(position, args.depth)
+        elapsed = time.perf_counter() - start_time
+        print(f"perft({args.depth}) = {nodes}  ({elapsed:.3f}s, {format_nps(nodes, elapsed)} nps)")
@@ -0,0 +1,127 @@
+"""Root splitting: the root moves of a search shared out over a pool of processes.
+
+Once start_pool has run, every search_root at root_split_min_depth or more
+searches its first move itself, to set alpha, and hands the other moves to
+the pool a batch of one move per worker at a time. Each worker searches its
+move's subtree with alphabeta under the alpha known when the batch went out,
+with a zero window first as in the serial search, and alpha is raised from
+the batch's results before the next batch. The workers use the main
+process's hash table, moved into shared memory as for lazy_smp, so the pool
+adds no hash memory and the table follows Hash and ucinewgame.
+
+The pool is a concurrent.futures.ProcessPoolExecutor kept for the whole
+session, so process start-up and module imports are paid once, not per move.
+This is a simpler complement to lazy_smp and can run alongside it.
+"""
+import concurrent.futures
+import multiprocessing
+
+import chess_engine
+#seconds between checks of the search's time limit while a batch is running
+batch_poll_interval = 0.01
+
+pool = None
+worker_count = 0
+#set to abandon the batch being searched by the workers
+stop_event = None
+#name of the shared table block the workers are attached to
+shared_table_name = None
+#worker side: chess_engine.search_count of the search the last task belonged to
+worker_search_count = None
+
+
+def start_pool(count):
+    """Searches the root moves in count worker processes from now on; 0 turns root splitting off."""
+    global pool, worker_count, stop_event, shared_table_name
+    stop_pool()
+    if count <= 0:
+        return
+    shared_table_name, slot_count = chess_engine.transposition_table.share()
+    stop_event = multiprocessing.Event()
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=count, initializer=_init_worker,
+                                                  initargs=(stop_event, shared_table_name, slot_count))
+    worker_count = count
+    #start the processes now rather than during the first search
+    list(pool.map(abs, range(count)))
+    chess_engine.root_move_splitter = search_root_moves
+
+
+def stop_pool():
+    global pool, worker_count, stop_event, shared_table_name
+    chess_engine.root_move_splitter = None
+    if pool is not None:
+        pool.shutdown()
+    if shared_table_name is not None:
+        chess_engine.transposition_table.unshare()
+    pool = stop_event = shared_table_name = None
+    worker_count = 0
+
+
+def _init_worker(stop, table_name, slot_count):
+    chess_engine.transposition_table.attach_shared(table_name, slot_count)
+    chess_engine.search_stop_event = stop
+    chess_engine.root_move_splitter = None
+
+
+def _search_move(position, move, depth, alpha, beta, search_count, generation):
+    """Worker side: (score of move for the side to move at the root, nodes), or (None, nodes) if stopped."""
+    global worker_search_count
+    if search_count != worker_search_count:
+        #first task of a new search: age the killers and history as _start_search does
+        worker_search_count = search_count
+        chess_engine._reset_move_ordering()
+    chess_engine.transposition_table.generation = generation
+    nodes_before = chess_engine.nodes_visited
+    chess_engine.make_move(position, move)
+    try:
+        value = -chess_engine.alphabeta(position, depth - 1, -beta, -alpha, 1)
+    except chess_engine.SearchAborted:
+        value = None
+    return value, chess_engine.nodes_visited - nodes_before
+
+
+def _search_batch(position, depth, moves, alpha, beta):
+    """Scores of moves searched by the workers in the window (alpha, beta)."""
+    #submit() pickles in a background thread, so the workers get a copy the search will not change
+    root = position.copy()
+    generation = chess_engine.transposition_table.generation
+    futures = [pool.submit(_search_move, root, move, depth, alpha, beta, chess_engine.search_count, generation)
+               for move in moves]
+    while concurrent.futures.wait(futures, timeout=batch_poll_interval)[1]:
+        if chess_engine._search_interrupted():
+            stop_event.set()
+            concurrent.futures.wait(futures)
+            stop_event.clear()
+            raise chess_engine.SearchAborted
+    results = [future.result() for future in futures]
+    chess_engine.nodes_visited += sum(nodes for _, nodes in results)
+    return [value for value, _ in results]
+
+
+def search_root_moves(position, depth, moves, alpha, beta):
+    """chess_engine._search_root_moves with all but the first move searched by the pool."""
+    if chess_engine.transposition_table.shared_block.name != shared_table_name:
+        start_pool(worker_count) #a Hash change gave the table a new block
+    chess_engine.make_move(position, moves[0])
+    best_value = -chess_engine.alphabeta(position, depth - 1, -beta, -alpha, 1)
+    chess_engine.unmake_move(position)
+    best_move = moves[0]
+    alpha = max(alpha, best_value)
+
+    for start in range(1, len(moves), worker_count):
+        if alpha >= beta:
+            break
+        batch = moves[start:start + worker_count]
+        values = _search_batch(position, depth, batch, alpha, alpha + 1)
+        #moves that beat alpha are searched again with the full window, as in the serial search
+        research = [index for index, value in enumerate(values) if alpha < value < beta]
+        if research:
+            exact_values = _search_batch(position, depth, [batch[index] for index in research], alpha, beta)
+            for index, value in zip(research, exact_values):
+                values[index] = value
+        for move, value in zip(batch, values):
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+    return best_move, best_value
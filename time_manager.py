@@ -0,0 +1,34 @@
+"""Turns the UCI clock parameters of a `go` command into search time limits.
+
+The soft limit is the time the search should aim for: no new iteration starts
+after it. The hard limit is the point where a running iteration is abandoned.
+All inputs are in milliseconds, as UCI sends them; limits are in seconds.
+"""
+
+#time kept back per move for communication and process overhead
+move_overhead_ms = 50
+#moves the remaining time is spread over when the GUI does not send movestogo
+default_moves_to_go = 30
+#how far past the soft limit the hard limit may reach
+hard_limit_factor = 4
+#never plan to spend more than this share of the remaining clock on one move
+max_clock_share = 0.5
+
+
+def compute_time_limits(is_white_turn, wtime=None, btime=None, winc=0, binc=0, movestogo=None, movetime=None):
+    """Returns (soft_limit, hard_limit) in seconds, or (None, None) if there is no clock."""
+    if movetime is not None:
+        limit = max(movetime - move_overhead_ms, 1) / 1000
+        return limit, limit
+
+    time_left = wtime if is_white_turn else btime
+    if time_left is None:
+        return None, None
+    increment = (winc if is_white_turn else binc) or 0
+    available = max(time_left - move_overhead_ms, 1)
+    moves_to_go = min(movestogo, default_moves_to_go) if movestogo else default_moves_to_go
+
+    soft_limit = available / moves_to_go + increment * 3 / 4
+    hard_limit = min(soft_limit * hard_limit_factor, available * max_clock_share)
+    soft_limit = min(soft_limit, hard_limit)
+    return soft_limit / 1000, hard_limit / 1000
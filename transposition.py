@@ -0,0 +1,177 @@
+"""Transposition table: search results by Zobrist key, kept across transpositions and searches.
+
+The table is a fixed number of buckets, addressed by key & bucket_mask, with
+two slots each: a depth-preferred slot that only gives way to a deeper (or
+same-position, or older-search) result, and an always-replace slot that takes
+whatever the depth-preferred slot refused.
+
+Slots live in two preallocated unsigned 64-bit arrays, 16 bytes per slot, so
+the memory use is exact and storing allocates nothing. Each slot's data word is
+packed as
+
+    bits  0-15  best move (0 when there is none)
+    bits 16-23  depth
+    bits 24-25  bound
+    bits 26-31  search generation (mod 64)
+    bits 32-63  score + score_offset
+
+and its check word holds key ^ data, so a slot belongs to key only if
+check ^ data == key.
+
+share() moves the table into multiprocessing.shared_memory so that searches
+in other processes can attach_shared() to it (see lazy_smp). No locking is
+needed: a slot torn by two processes writing it at once, or read halfway
+through a write, fails the check and reads as empty.
+"""
+from array import array
+from multiprocessing import shared_memory
+
+#what the stored score is known to be relative to the true value
+bound_exact = 0
+bound_lower = 1 #the true value is >= score (the search failed high)
+bound_upper = 2 #the true value is <= score (the search failed low)
+
+default_hash_mb = 16
+bytes_per_slot = 16
+slots_per_bucket = 2
+
+#scores are integers within +/-2^31, mate scores included
+score_offset = 1 << 31
+generation_mask = 63
+
+
+def pack_entry(depth, score, bound, move, generation):
+    return ((move or 0) | depth << 16 | bound << 24 | (generation & generation_mask) << 26
+            | (score + score_offset) << 32)
+
+
+def unpack_score(data):
+    return (data >> 32) - score_offset
+
+
+class TranspositionTable:
+    __slots__ = ('bucket_mask', 'checks', 'data', 'generation', 'shared_block', 'owns_shared_block', 'share_count')
+
+    def __init__(self, size_mb=default_hash_mb):
+        self.shared_block = None
+        self.owns_shared_block = False
+        self.share_count = 0 #share() calls not yet matched by unshare()
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        """Reallocates for at most size_mb megabytes, rounded down to a power of two buckets."""
+        bucket_count = 1
+        while bucket_count * 2 * slots_per_bucket * bytes_per_slot <= size_mb * 1024 * 1024:
+            bucket_count *= 2
+        self.bucket_mask = bucket_count - 1
+        self._allocate(bucket_count * slots_per_bucket)
+
+    def clear(self):
+        if self.shared_block is not None:
+            #in place, so the attached processes keep seeing the same table
+            size = self.size_bytes()
+            self.shared_block.buf[:size] = bytes(size)
+            self.generation = 0
+        else:
+            self._allocate(len(self.data))
+
+    def _allocate(self, slot_count):
+        """Fresh, empty slots; a shared table gets a new shared block (which processes must attach again)."""
+        if self.shared_block is not None:
+            self._release_shared_block()
+            self._map_shared_block(shared_memory.SharedMemory(create=True, size=slot_count * bytes_per_slot),
+                                   slot_count, True)
+        else:
+            self.checks = array('Q', bytes(slot_count * 8))
+            self.data = array('Q', bytes(slot_count * 8))
+        self.generation = 0
+
+    def share(self):
+        """Moves the table into shared memory; returns (name, slot_count) for attach_shared.
+
+        Calls nest: the table stays shared until each one is matched by unshare().
+        """
+        self.share_count += 1
+        if self.shared_block is None:
+            slot_count = len(self.data)
+            checks, data = self.checks, self.data
+            self._map_shared_block(shared_memory.SharedMemory(create=True, size=slot_count * bytes_per_slot),
+                                   slot_count, True)
+            self.checks[:] = checks
+            self.data[:] = data
+        return self.shared_block.name, len(self.data)
+
+    def attach_shared(self, name, slot_count):
+        """Uses the table another process shared as name instead of this one."""
+        self.owns_shared_block = False #a forked process inherits the block its parent still owns
+        self.share_count = 0
+        self._release_shared_block()
+        self._map_shared_block(shared_memory.SharedMemory(name=name), slot_count, False)
+
+    def detach(self):
+        """Drops this process's view of a table it attached to, leaving the table unusable here."""
+        self._release_shared_block()
+
+    def unshare(self):
+        """Ends a share(); the last one copies the table back into private memory and frees the block."""
+        self.share_count = max(self.share_count - 1, 0)
+        if self.shared_block is not None and not self.share_count:
+            slot_count = len(self.data)
+            checks, data = array('Q', bytes(slot_count * 8)), array('Q', bytes(slot_count * 8))
+            #buffer copies, far faster than building the arrays item by item
+            memoryview(checks)[:] = self.checks
+            memoryview(data)[:] = self.data
+            self._release_shared_block()
+            self.checks, self.data = checks, data
+
+    def _map_shared_block(self, block, slot_count, owns_block):
+        self.shared_block = block
+        self.owns_shared_block = owns_block
+        self.bucket_mask = slot_count // slots_per_bucket - 1
+        self.checks = block.buf[:slot_count * 8].cast('Q')
+        self.data = block.buf[slot_count * 8:slot_count * bytes_per_slot].cast('Q')
+
+    def _release_shared_block(self):
+        if self.shared_block is None:
+            return
+        #the views must go before the block can be closed
+        self.checks.release()
+        self.data.release()
+        self.checks = self.data = None
+        self.shared_block.close()
+        if self.owns_shared_block:
+            self.shared_block.unlink()
+        self.shared_block = None
+        self.owns_shared_block = False
+
+    def size_bytes(self):
+        return len(self.data) * bytes_per_slot
+
+    def new_search(self):
+        """Marks older entries as stale, so the depth-preferred slots can be reused."""
+        self.generation = (self.generation + 1) & generation_mask
+
+    def probe(self, key):
+        """Returns (depth, score, bound, move) stored for key, or None. move is None if unknown."""
+        slot_index = (key & self.bucket_mask) * 2
+        data = self.data[slot_index]
+        if self.checks[slot_index] ^ data != key:
+            slot_index += 1
+            data = self.data[slot_index]
+            if self.checks[slot_index] ^ data != key:
+                return None
+        return ((data >> 16) & 255, unpack_score(data), (data >> 24) & 3, (data & 0xFFFF) or None)
+
+    def store(self, key, depth, score, bound, move):
+        slot_index = (key & self.bucket_mask) * 2
+        preferred = self.data[slot_index]
+        preferred_is_key = self.checks[slot_index] ^ preferred == key
+        if preferred_is_key or depth >= (preferred >> 16) & 255 \
+           or (preferred >> 26) & generation_mask != self.generation:
+            if move is None and preferred_is_key:
+                move = preferred & 0xFFFF #keep the known best move of a fail-low re-store
+        else:
+            slot_index += 1
+        data = pack_entry(depth, score, bound, move, self.generation)
+        self.data[slot_index] = data
+        self.checks[slot_index] = key ^ data
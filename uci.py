@@ -1,17 +1,32 @@
+import multiprocessing
 import sys
 import time
 import chess_engine
+import lazy_smp
+import perft
+import root_split
+import time_manager
+from move_gen import move_to_tuple, move_to_uci_string, tuple_to_move
 import utils as u
+from transposition import default_hash_mb
+
+max_hash_mb = 4096
+#search processes, the main one included (see lazy_smp)
+max_threads = 256
+#processes root_split may hand root moves to, 0 for none
+max_root_split_workers = 256
+#depth used by a plain "go" without depth or clock parameters
+default_search_depth = 4
+#depth cap when the clock decides when to stop
+max_search_depth = 64
+go_limit_names = ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth")
 
 def log(message):
     print(message, file=sys.stderr, flush=True)
 
 def uci_loop():
     log("UCI Engine Started")
-    current_board = None
-    current_cr = None
-    current_ep = None
-    is_white_turn = True
+    current_position = None
 
     while True:
         line = sys.stdin.readline().strip()
@@ -25,6 +40,9 @@ def uci_loop():
         if command == "uci":
             print("id name PyChessBot 0.1")
             print("id author YourName")
+            print(f"option name Hash type spin default {default_hash_mb} min 1 max {max_hash_mb}")
+            print(f"option name Threads type spin default 1 min 1 max {max_threads}")
+            print(f"option name RootSplitWorkers type spin default 0 min 0 max {max_root_split_workers}")
             print("uciok")
             sys.stdout.flush()
         elif command == "isready":
@@ -32,35 +50,65 @@ def uci_loop():
             sys.stdout.flush()
         elif command == "quit":
             log("Quitting.")
+            lazy_smp.stop_workers()
+            root_split.stop_pool()
             break
         elif command == "ucinewgame":
             try:
-                chess_engine.reset_game_state()
-                current_board = None
+                current_position = None
+                chess_engine.transposition_table.clear()
                 log("New game state reset.")
             except Exception as e:
                 log(f"Error during ucinewgame reset: {e}")
 
+        elif command == "setoption":
+            if "name" not in parts or "value" not in parts:
+                log(f"  Malformed setoption: {line}")
+                continue
+            option_name = " ".join(parts[parts.index("name") + 1:parts.index("value")])
+            option_value = " ".join(parts[parts.index("value") + 1:])
+            if option_name.lower() == "hash":
+                try:
+                    hash_mb = min(max(int(option_value), 1), max_hash_mb)
+                except ValueError:
+                    log(f"  Invalid Hash value: {option_value}")
+                    continue
+                chess_engine.transposition_table.resize(hash_mb)
+                log(f"  Hash set to {hash_mb} MB ({chess_engine.transposition_table.size_bytes()} bytes allocated)")
+            elif option_name.lower() == "threads":
+                try:
+                    threads = min(max(int(option_value), 1), max_threads)
+                except ValueError:
+                    log(f"  Invalid Threads value: {option_value}")
+                    continue
+                lazy_smp.set_worker_count(threads - 1)
+                log(f"  Threads set to {threads}")
+            elif option_name.lower() == "rootsplitworkers":
+                try:
+                    split_workers = min(max(int(option_value), 0), max_root_split_workers)
+                except ValueError:
+                    log(f"  Invalid RootSplitWorkers value: {option_value}")
+                    continue
+                root_split.start_pool(split_workers)
+                log(f"  RootSplitWorkers set to {split_workers}")
+            else:
+                log(f"  Unknown option: {option_name}")
+
         elif command == "position":
             log("Parsing position command...")
             try:
-                chess_engine.reset_game_state()
-                current_board = list(chess_engine.board_array) 
-                current_cr = chess_engine.castling_rights
-                current_ep = chess_engine.en_passant_target
-                is_white_turn = (chess_engine.side_to_move == 'w')
-                log(f"  Initial state: Turn={'W' if is_white_turn else 'B'} CR={current_cr} EP={current_ep}")
+                current_position = chess_engine.starting_position()
 
                 moves_start_index = -1
                 if "startpos" in parts:
                     moves_start_index = parts.index("startpos") + 1
                 elif "fen" in parts:
                     fen_start_index = parts.index("fen") + 1
-                    fen_parts = parts[fen_start_index : fen_start_index + 6] 
-                    fen_string = " ".join(fen_parts)
-                    log(f"  FEN Received (basic parse): {fen_string}")
-                    log("  FEN parsing needs implementation!")
-                    moves_start_index = fen_start_index + 6 
+                    moves_start_index = parts.index("moves") if "moves" in parts else len(parts)
+                    fen_string = " ".join(parts[fen_start_index:moves_start_index])
+                    log(f"  FEN Received: {fen_string}")
+                    current_position = parse_fen(fen_string)
+                log(f"  Initial state: {describe_state(current_position)}")
 
                 if moves_start_index != -1 and "moves" in parts[moves_start_index:]:
                     moves_index = parts.index("moves", moves_start_index) + 1
@@ -69,13 +117,10 @@ def uci_loop():
                     for move_uci in move_list:
                         log(f"    Applying: {move_uci}")
                         try:
-                            move_tuple = uci_move_to_tuple(current_board, move_uci) 
+                            move_tuple = uci_move_to_tuple(current_position.board, move_uci) 
                             log(f"      Converted to tuple: {move_tuple}")
-                            _cap, next_cr, next_ep = chess_engine.make_move(current_board, move_tuple, current_cr, current_ep)
-                            current_cr = next_cr
-                            current_ep = next_ep
-                            is_white_turn = (chess_engine.side_to_move == 'w')
-                            log(f"      State after {move_uci}: Turn={'W' if is_white_turn else 'B'} CR={current_cr} EP={current_ep}")
+                            chess_engine.make_move(current_position, tuple_to_move(move_tuple))
+                            log(f"      State after {move_uci}: {describe_state(current_position)}")
                         except Exception as e:
                              log(f"      ERROR applying move {move_uci}: {e}")
                              break
@@ -86,35 +131,42 @@ def uci_loop():
 
         elif command == "go":
             log("Received 'go' command")
-            search_depth = 4
-            if "depth" in parts:
-                try:
-                    depth_index = parts.index("depth") + 1
-                    search_depth = int(parts[depth_index])
-                    log(f"  Search depth set to: {search_depth}")
-                except (ValueError, IndexError):
-                    log("  Error parsing depth, using default.")
-                    search_depth = 4 
-
-            if current_board is None:
+            if current_position is None:
                  log("ERROR: 'go' received before 'position'. Cannot search.")
                  continue
 
-            log(f"  Starting search: Depth={search_depth}, Turn={'W' if is_white_turn else 'B'}, CR={current_cr}, EP={current_ep}")
+            if "perft" in parts:
+                try:
+                    perft_depth = int(parts[parts.index("perft") + 1])
+                except (ValueError, IndexError):
+                    log("  Error parsing perft depth.")
+                    continue
+                perft.run_divide(current_position, perft_depth)
+                continue
+
+            go_limits = parse_go_limits(parts)
+            soft_limit, hard_limit = time_manager.compute_time_limits(
+                current_position.is_white_turn, go_limits.get("wtime"), go_limits.get("btime"),
+                go_limits.get("winc"), go_limits.get("binc"), go_limits.get("movestogo"), go_limits.get("movetime"))
+            if "depth" in go_limits:
+                search_depth = go_limits["depth"]
+            else:
+                search_depth = default_search_depth if soft_limit is None else max_search_depth
+
+            log(f"  Starting search: Depth={search_depth}, Soft={soft_limit}, Hard={hard_limit}, "
+                f"{describe_state(current_position)}")
             try:
                 start_time = time.time()
-                best_move_tuple, eval_score = chess_engine.find_best_move(
-                    current_board,
-                    search_depth,
-                    is_white_turn,
-                    current_cr,
-                    current_ep
-                )
+                best_move, eval_score, completed_depth = lazy_smp.parallel_search(
+                    current_position, search_depth, soft_limit, hard_limit,
+                    lambda *iteration: print_iteration_info(current_position.is_white_turn, *iteration))
                 end_time = time.time()
-                log(f"  Search finished in {end_time - start_time:.2f}s. Result: {best_move_tuple}, Eval: {eval_score}")
+                best_move_tuple = move_to_tuple(best_move) if best_move is not None else None
+                log(f"  Search finished in {end_time - start_time:.2f}s at depth {completed_depth}. "
+                    f"Result: {best_move_tuple}, Eval: {eval_score}")
 
                 if best_move_tuple:
-                    uci_move_str = tuple_to_uci_move(best_move_tuple)
+                    uci_move_str = move_to_uci_string(best_move)
                     print(f"bestmove {uci_move_str}")
                     sys.stdout.flush()
                     log(f"Sent: bestmove {uci_move_str}")
@@ -130,13 +182,40 @@ def uci_loop():
         else:
             log(f"Unknown command: {command}")
 
+def parse_go_limits(parts):
+    """Reads the integer search parameters of a go command into a dict."""
+    go_limits = {}
+    for name in go_limit_names:
+        if name in parts:
+            try:
+                go_limits[name] = int(parts[parts.index(name) + 1])
+            except (ValueError, IndexError):
+                log(f"  Error parsing {name}, ignoring it.")
+    return go_limits
+
+def uci_score(score, is_white_turn):
+    """The engine's White-side score as a UCI score from the side to move's view."""
+    if not is_white_turn:
+        score = -score
+    if chess_engine.is_mate_score(score):
+        mate_moves = (chess_engine.mate_distance_plies(score) + 1) // 2
+        return f"mate {mate_moves if score > 0 else -mate_moves}"
+    return f"cp {score // 100}" #evaluation units are 1/100 centipawn
+
+def print_iteration_info(is_white_turn, depth, best_move, score, nodes, elapsed):
+    pv = f" pv {move_to_uci_string(best_move)}" if best_move is not None else ""
+    print(f"info depth {depth} score {uci_score(score, is_white_turn)} nodes {nodes} "
+          f"time {int(elapsed * 1000)} nps {int(nodes / elapsed) if elapsed > 0 else 0}{pv}")
+    sys.stdout.flush()
+
+def describe_state(position):
+    return (f"Turn={'W' if position.is_white_turn else 'B'} CR={position.castling_rights} "
+            f"EP={position.en_passant_target} Key={position.zobrist_key:016x}")
+
 def parse_fen(fen_string):
-     log("parse_fen needs implementation")
-     chess_engine.reset_game_state()
-     return list(chess_engine.board_array), (chess_engine.side_to_move == 'w'), chess_engine.castling_rights, chess_engine.en_passant_target
+     return chess_engine.position_from_fen(fen_string)
 
 def uci_move_to_tuple(board, uci_move):
-    log(f"uci_move_to_tuple needs implementation for: {uci_move}")
     if len(uci_move) < 4 or len(uci_move) > 5:
          raise ValueError(f"Invalid UCI move format: {uci_move}")
 
@@ -152,29 +231,18 @@ def uci_move_to_tuple(board, uci_move):
 
     if promotion and abs(piece) == 1 and (to_idx // 8 == 0 or to_idx // 8 == 7):
          move_info = promotion
+    elif abs(piece) == 6 and to_idx - from_idx == 2:
+         move_info = 'castle_k'
+    elif abs(piece) == 6 and from_idx - to_idx == 2:
+         move_info = 'castle_q'
+    elif abs(piece) == 1 and (to_idx - from_idx) % 8 != 0 and board[to_idx] == 0:
+         move_info = 'ep'
     if move_info:
         return (from_idx, to_idx, move_info)
     else:
         return (from_idx, to_idx)
 
 
-def tuple_to_uci_move(move_tuple):
-    log(f"tuple_to_uci_move needs implementation for: {move_tuple}")
-    if not move_tuple or len(move_tuple) < 2:
-        return "0000"
-
-    from_idx, to_idx = move_tuple[:2]
-    move_info = move_tuple[2] if len(move_tuple) > 2 else None
-
-    from_sq = u.index_1d_to_square(from_idx)
-    to_sq = u.index_1d_to_square(to_idx)
-
-    promotion_char = ""
-    if move_info in ('q', 'r', 'n', 'b', 'Q', 'R', 'N', 'B'):
-        promotion_char = move_info.lower()
-
-    return f"{from_sq}{to_sq}{promotion_char}"
-
-
 if __name__ == "__main__":
+    multiprocessing.freeze_support() #lets the frozen executable start the Threads worker processes
     uci_loop()
\ No newline at end of file
@@ -34,6 +34,35 @@ def get_starting_board_array():
     return board_1d
 
 
+def fen_to_board_state(fen_string):
+    """Parses a FEN string into (board_1d, is_white_turn, castling_rights, en_passant_target)."""
+    fields = fen_string.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid FEN (need at least 4 fields): '{fen_string}'")
+    placement, active_color, castling_field, ep_field = fields[:4]
+
+    board_1d = [0] * 64
+    index = 0
+    for char in placement:
+        if char == '/':
+            continue
+        elif char.isdigit():
+            index += int(char)
+        elif char.lower() in piece_values_from_char and index < 64:
+            piece_base_value = piece_values_from_char[char.lower()]
+            board_1d[index] = piece_base_value if char.isupper() else -piece_base_value
+            index += 1
+        else:
+            raise ValueError(f"Invalid FEN placement: '{placement}'")
+    if index != 64:
+        raise ValueError(f"Invalid FEN placement: '{placement}'")
+
+    is_white_turn = active_color == 'w'
+    castling_rights = '' if castling_field == '-' else castling_field
+    en_passant_target = None if ep_field == '-' else square_to_index_1d(ep_field)
+    return board_1d, is_white_turn, castling_rights, en_passant_target
+
+
 def square_to_index_1d(square_notation):
     """Converts algebraic notation (e.g., 'e4') to 0-63 index."""
     try:
@@ -84,7 +113,7 @@ def print_board(board):
 
 def print_board_with_moves(board, possible_moves, piece_sq_notation=None):
     """Prints board highlighting potential move destinations ('x') for a given piece."""
-    move_squares_indexes = set(move[1] for move in possible_moves)
+    move_squares_indexes = set((move >> 6) & 63 for move in possible_moves) #encoded moves, see move_gen
     piece_index_sq = None
     if piece_sq_notation:
         try: